@@ -0,0 +1,254 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+from benchmarks.synthetic import write_sources
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    """
+    Returns a port no server listens on.
+    """
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(source_dir: Path, cache_dir: Path) -> tuple[subprocess.Popen, str]:
+    """
+    Starts the API in another process and waits until it answers.
+    """
+
+    port = free_port()
+    env = dict(
+        os.environ,
+        CRIMESFRANCE_SOURCE_DIR=str(source_dir),
+        CRIMESFRANCE_CACHE_DIR=os.environ.get("CRIMESFRANCE_CACHE_DIR", str(cache_dir)),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "tools.api", "--port", str(port), "--quiet"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    url = f"http://127.0.0.1:{port}"
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError("the API exited before answering")
+        try:
+            get(http.client.HTTPConnection("127.0.0.1", port), "/v1")
+            return server, url
+        except OSError:
+            time.sleep(0.5)
+
+
+def get(
+    connection: http.client.HTTPConnection, path: str, headers: dict | None = None
+) -> tuple[int, str | None, bytes]:
+    """
+    Sends a GET request and returns the status, the ETag and the body of the response.
+    """
+
+    connection.request("GET", path, headers=headers or {})
+    response = connection.getresponse()
+    return response.status, response.getheader("ETag"), response.read()
+
+
+def make_paths(url: str, n_cities: int, seed: int = 0) -> list[str]:
+    """
+    Returns the requests of the benchmark: every endpoint, for random cities,
+    years and categories.
+    """
+
+    address = urlsplit(url)
+    connection = http.client.HTTPConnection(address.hostname, address.port)
+    cities = json.loads(get(connection, "/v1/cities")[2])
+    years = [year["annee"] for year in json.loads(get(connection, "/v1/years")[2])]
+    categories = json.loads(get(connection, f"/v1/categories?year={years[-1]}")[2])
+
+    rng = random.Random(seed)
+    cities = rng.sample([city["city_dep"] for city in cities], n_cities)
+    categories = [category["classe"] for category in categories]
+
+    paths = ["/v1/years"]
+    for year in years:
+        paths.append(f"/v1/categories?year={year}")
+        for category in categories:
+            for per_capita in (0, 1):
+                query = {"year": year, "category": category, "per_capita": per_capita}
+                paths.append(f"/v1/top-cities?{urlencode(query)}")
+    for city in cities:
+        paths.append(f"/v1/city/years?{urlencode({'city': city})}")
+        paths.append(f"/v1/city/categories?{urlencode({'city': city})}")
+    return paths
+
+
+def warm_up(url: str, paths: list[str], fmt: str) -> None:
+    """
+    Requests every path once, so the responses are cached by the API.
+    """
+
+    address = urlsplit(url)
+    connection = http.client.HTTPConnection(address.hostname, address.port)
+    for path in paths:
+        get(connection, f"{path}{'&' if '?' in path else '?'}format={fmt}")
+
+
+def run_client(
+    client_id: int,
+    url: str,
+    paths: list[str],
+    deadline: float,
+    fmt: str,
+    revalidate: float,
+    results: list,
+    lock: threading.Lock,
+) -> None:
+    """
+    Sends requests on one connection until the deadline, recording their latencies.
+    A share of the requests to already seen paths send the ETag they got.
+    """
+
+    address = urlsplit(url)
+    connection = http.client.HTTPConnection(address.hostname, address.port)
+    rng = random.Random(client_id)
+    etags = {}
+    records = []
+
+    while time.perf_counter() < deadline:
+        path = rng.choice(paths)
+        path = f"{path}{'&' if '?' in path else '?'}format={fmt}"
+        headers = {}
+        if path in etags and rng.random() < revalidate:
+            headers["If-None-Match"] = etags[path]
+
+        start = time.perf_counter()
+        status, etag, body = get(connection, path, headers)
+        latency = time.perf_counter() - start
+
+        etags[path] = etag
+        endpoint = urlsplit(path).path
+        records.append((endpoint, status, latency, len(body)))
+
+    with lock:
+        results.extend(records)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measures the throughput of the API with concurrent local clients."
+    )
+    parser.add_argument("--url", help="URL of a running API, one is started by default")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--communes", type=int, default=35_000)
+    parser.add_argument(
+        "--source-dir",
+        type=Path,
+        help="directory with the sources, synthetic ones are generated by default",
+    )
+    parser.add_argument("--cities", type=int, default=500, help="cities requested")
+    parser.add_argument("--format", choices=["json", "arrow"], default="json")
+    parser.add_argument(
+        "--cold",
+        action="store_true",
+        help="don't request every path once before measuring",
+    )
+    parser.add_argument(
+        "--revalidate",
+        type=float,
+        default=0.5,
+        help="share of the requests sending the ETag of a previous response",
+    )
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        workdir = Path(tempfile.mkdtemp(prefix="crimesfrance-api-"))
+        source_dir = args.source_dir
+        if source_dir is None:
+            source_dir = workdir / "sources"
+            print(f"Writing synthetic sources for {args.communes:,} communes...")
+            write_sources(source_dir, args.communes)
+        start = time.perf_counter()
+        server, url = start_server(source_dir, workdir / "cache")
+        print(f"API started in {time.perf_counter() - start:.1f}s at {url}")
+
+    try:
+        paths = make_paths(url, args.cities)
+        if not args.cold:
+            start = time.perf_counter()
+            warm_up(url, paths, args.format)
+            elapsed = time.perf_counter() - start
+            print(f"Warmed up {len(paths)} paths in {elapsed:.1f}s")
+
+        results = []
+        lock = threading.Lock()
+        start = time.perf_counter()
+        deadline = start + args.duration
+
+        clients = [
+            threading.Thread(
+                target=run_client,
+                args=(
+                    i,
+                    url,
+                    paths,
+                    deadline,
+                    args.format,
+                    args.revalidate,
+                    results,
+                    lock,
+                ),
+            )
+            for i in range(args.clients)
+        ]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    latencies = defaultdict(list)
+    for endpoint, _, latency, _ in results:
+        latencies[endpoint].append(latency * 1000)
+    statuses = Counter(status for _, status, _, _ in results)
+
+    print(f"\n{args.clients} clients, {elapsed:.1f}s, {len(results)} requests")
+    print(f"Throughput: {len(results) / elapsed:.0f} requests/s")
+    print(f"Statuses: {dict(sorted(statuses.items()))}\n")
+    print(f"{'endpoint':<22} {'requests':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint in sorted(latencies):
+        p50, p95, p99 = np.percentile(latencies[endpoint], [50, 95, 99])
+        print(
+            f"{endpoint:<22} {len(latencies[endpoint]):>9} "
+            f"{p50:>8.1f} {p95:>8.1f} {p99:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
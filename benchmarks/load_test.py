@@ -0,0 +1,194 @@
+import argparse
+import os
+import random
+import runpy
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic import write_sources
+
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGES = sorted((ROOT / "pages").glob("*.py"))
+
+_session = threading.local()
+
+
+def rss_mb() -> float:
+    """
+    Returns the resident memory of the process in MB.
+    """
+
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def patch_widgets() -> None:
+    """
+    Replaces the widgets used by the pages with random choices made per session,
+    so that every simulated session moves the sliders and picks other cities.
+    """
+
+    import streamlit as st
+
+    def slider(label, min_value=None, max_value=None, value=None, *args, **kwargs):
+        return _session.rng.randint(min_value, max_value)
+
+    def selectbox(label, options, *args, **kwargs):
+        options = list(options)
+        return _session.rng.choice(options) if options else None
+
+    def multiselect(label, options, default=None, *args, **kwargs):
+        options = list(options)
+        return _session.rng.sample(options, min(len(options), 3))
+
+    def toggle(label, *args, **kwargs):
+        return _session.rng.random() < 0.5
+
+    st.slider = slider
+    st.selectbox = selectbox
+    st.multiselect = multiselect
+    st.toggle = toggle
+
+
+def attach_session(session_id: int):
+    """
+    Attaches a Streamlit session to the current thread, as the server does for
+    each browser tab, with its own random widget choices.
+    """
+
+    from tools.cache import attach_script_context
+
+    ctx = attach_script_context(f"load-test-{session_id}")
+    _session.rng = random.Random(session_id)
+    return ctx
+
+
+def run_page(ctx, page: Path) -> None:
+    """
+    Runs a page script once, like a rerun of the server.
+    """
+
+    ctx.reset(page_script_hash=page.stem)
+    runpy.run_path(str(page), run_name="__main__")
+
+
+def run_session(
+    session_id: int,
+    deadline: float,
+    pages: list[Path],
+    results: list,
+    lock: threading.Lock,
+) -> None:
+    """
+    Runs the pages in random order until the deadline, recording their latencies.
+    """
+
+    ctx = attach_session(session_id)
+
+    while time.perf_counter() < deadline:
+        page = _session.rng.choice(pages)
+        start = time.perf_counter()
+        run_page(ctx, page)
+        latency = time.perf_counter() - start
+
+        with lock:
+            results.append((page.stem, start, latency))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Runs the pages headlessly with simulated concurrent sessions."
+    )
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=60, help="seconds")
+    parser.add_argument("--communes", type=int, default=35_000)
+    parser.add_argument(
+        "--source-dir",
+        type=Path,
+        help="directory with the sources, synthetic ones are generated by default",
+    )
+    parser.add_argument("--sample-every", type=float, default=1, help="seconds")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="crimesfrance-load-"))
+    source_dir = args.source_dir
+    if source_dir is None:
+        source_dir = workdir / "sources"
+        print(f"Writing synthetic sources for {args.communes:,} communes...")
+        write_sources(source_dir, args.communes)
+
+    # the data layer reads its settings at import time
+    os.environ["CRIMESFRANCE_SOURCE_DIR"] = str(source_dir)
+    os.environ.setdefault("CRIMESFRANCE_CACHE_DIR", str(workdir / "cache"))
+    sys.path.insert(0, str(ROOT))
+
+    import streamlit.logger
+
+    streamlit.logger.set_log_level("error")
+    patch_widgets()
+
+    # one warm-up run per page loads the datasets, as the first visitor would
+    ctx = attach_session(-1)
+    start = time.perf_counter()
+    for page in PAGES:
+        run_page(ctx, page)
+    print(f"Warm-up: {time.perf_counter() - start:.1f}s, RSS {rss_mb():.0f} MB")
+
+    results = []
+    lock = threading.Lock()
+    rss_samples = []
+    start = time.perf_counter()
+    deadline = start + args.duration
+
+    sessions = [
+        threading.Thread(
+            target=run_session, args=(i, deadline, PAGES, results, lock), daemon=True
+        )
+        for i in range(args.sessions)
+    ]
+    for session in sessions:
+        session.start()
+    while any(session.is_alive() for session in sessions):
+        rss_samples.append((time.perf_counter() - start, rss_mb()))
+        time.sleep(args.sample_every)
+    elapsed = time.perf_counter() - start
+
+    latencies = defaultdict(list)
+    for page, _, latency in results:
+        latencies[page].append(latency * 1000)
+
+    print(f"\n{args.sessions} sessions, {elapsed:.1f}s, {len(results)} page runs")
+    print(f"Throughput: {len(results) / elapsed:.1f} pages/s\n")
+    print(f"{'page':<28} {'runs':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for page in sorted(latencies):
+        p50, p95, p99 = np.percentile(latencies[page], [50, 95, 99])
+        print(
+            f"{page:<28} {len(latencies[page]):>6} {p50:>8.0f} {p95:>8.0f} {p99:>8.0f}"
+        )
+
+    print("\nRSS over time:")
+    step = max(len(rss_samples) // 10, 1)
+    for t, rss in rss_samples[::step]:
+        print(f"{t:>8.1f}s {rss:>8.0f} MB")
+    growth = rss_samples[-1][1] - rss_samples[0][1] if rss_samples else 0
+    print(f"Growth during the run: {growth:+.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
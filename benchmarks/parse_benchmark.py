@@ -0,0 +1,47 @@
+import argparse
+import gzip
+import time
+from pathlib import Path
+
+from benchmarks.synthetic import make_main_dataset, to_csv_gz
+from tools.parsing import MAIN_DTYPES, read_csv_parallel
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Measures the throughput of the parallel CSV parser."
+    )
+    parser.add_argument("--file", type=Path, help="gzipped communal CSV to parse")
+    parser.add_argument("--communes", type=int, default=35_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.file:
+        content = args.file.read_bytes()
+    else:
+        content = to_csv_gz(make_main_dataset(args.communes))
+    size_mb = len(gzip.decompress(content)) / 1_000_000
+
+    print(f"{size_mb:.1f} MB of CSV")
+    print(f"{'workers':>8} {'best (s)':>10} {'MB/s':>8} {'speedup':>8}")
+
+    baseline = None
+    for workers in args.workers:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            df = read_csv_parallel(content, dtype=MAIN_DTYPES, workers=workers)
+            timings.append(time.perf_counter() - start)
+
+        best = min(timings)
+        baseline = baseline or best
+        print(
+            f"{workers:>8} {best:>10.2f} {size_mb / best:>8.1f} {baseline / best:>7.2f}x"
+        )
+
+    print(f"{len(df):,} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import gzip
+import io
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+CLASSES = [
+    "Coups et blessures volontaires",
+    "Coups et blessures volontaires intrafamiliaux",
+    "Autres coups et blessures volontaires",
+    "Violences sexuelles",
+    "Vols avec armes",
+    "Vols violents sans arme",
+    "Vols sans violence contre des personnes",
+    "Cambriolages de logement",
+    "Vols de véhicules",
+    "Vols dans les véhicules",
+    "Vols d'accessoires sur véhicules",
+    "Destructions et dégradations volontaires",
+    "Trafic de stupéfiants",
+    "Usage de stupéfiants",
+]
+
+YEARS = list(range(16, 23))
+
+
+def make_main_dataset(communes: int = 35_000, seed: int = 0) -> pd.DataFrame:
+    """
+    Builds a synthetic communal dataset with the same schema as the real one.
+
+    Parameters:
+    -----------
+    communes: int
+        The number of communes to generate.
+    seed: int
+        The seed of the random generator.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame shaped like the communal dataset.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    deps = np.array([f"{dep:02d}" for dep in range(1, 96)] + ["2A", "2B", "971"])
+    deps = deps[deps != "20"][rng.integers(0, len(deps) - 1, communes)]
+    codes = np.array([f"{dep}{i % 1000:03d}"[:5] for i, dep in enumerate(deps)])
+    codes = pd.unique(codes)
+    pop = rng.lognormal(7, 1.5, len(codes)).astype(int) + 50
+
+    n_rows = len(codes) * len(YEARS) * len(CLASSES)
+    commune = np.repeat(np.arange(len(codes)), len(YEARS) * len(CLASSES))
+    year = np.tile(np.repeat(YEARS, len(CLASSES)), len(codes))
+    classe = np.tile(np.arange(len(CLASSES)), len(codes) * len(YEARS))
+
+    faits = rng.poisson(pop[commune] / 300).astype(float)
+    diffused = rng.random(n_rows) < 0.3
+    faits[diffused] = np.nan
+
+    return pd.DataFrame(
+        {
+            "CODGEO_2023": codes[commune],
+            "annee": year,
+            "classe": np.array(CLASSES)[classe],
+            "unité.de.compte": "victime",
+            "valeur.publiée": np.where(diffused, "ndiff", "diff"),
+            "faits": faits,
+            "tauxpourmille": np.char.replace(
+                np.round(faits / pop[commune] * 1000, 1).astype(str), ".", ","
+            ),
+            "complementinfoval": "",
+            "complementinfotaux": "",
+            "POP": pop[commune],
+            "millPOP": 2000 + year,
+            "LOG": pop[commune] // 2,
+            "millLOG": 2000 + year,
+        }
+    )
+
+
+def department_of(codes: pd.Series) -> pd.Series:
+    """
+    Returns the department code of each commune code ("97xxx" communes are overseas).
+    """
+
+    overseas = codes.str.startswith("97")
+    return codes.str[:2].where(~overseas, codes.str[:3])
+
+
+def make_dep_dataset(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Builds the departmental dataset matching a synthetic communal dataset.
+
+    Parameters:
+    -----------
+    df: pd.DataFrame
+        A dataset built by make_main_dataset.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame shaped like the departmental dataset.
+    """
+
+    df = df.assign(dep=department_of(df["CODGEO_2023"]))
+
+    df_dep = df.groupby(["dep", "annee", "classe"], as_index=False)["faits"].sum()
+    df_pop = (
+        df.drop_duplicates(["CODGEO_2023", "annee"])
+        .groupby(["dep", "annee"], as_index=False)[["POP", "LOG"]]
+        .sum()
+    )
+    df_dep = df_dep.merge(df_pop, on=["dep", "annee"])
+
+    return pd.DataFrame(
+        {
+            "Code.département": df_dep["dep"],
+            "Code.région": "11",
+            "annee": df_dep["annee"],
+            "classe": df_dep["classe"],
+            "unité.de.compte": "victime",
+            "faits": df_dep["faits"].astype(int),
+            "POP": df_dep["POP"],
+            "millPOP": 2000 + df_dep["annee"],
+            "LOG": df_dep["LOG"],
+            "millLOG": 2000 + df_dep["annee"],
+            "tauxpourmille": (df_dep["faits"] / df_dep["POP"] * 1000).round(2),
+        }
+    )
+
+
+def make_comp_dataset(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Builds the "zonages supracommunaux" sheet matching a synthetic communal dataset.
+
+    Parameters:
+    -----------
+    df: pd.DataFrame
+        A dataset built by make_main_dataset.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame shaped like the complementary dataset.
+    """
+
+    codes = pd.Series(df["CODGEO_2023"].unique())
+    deps = department_of(codes)
+    number = codes.str[-3:].astype(int)
+
+    return pd.DataFrame(
+        {
+            "CODGEO": codes,
+            "LIBGEO": "Commune " + codes,
+            "DEP": deps,
+            "REG": "11",
+            "EPCI": deps + (number // 20).astype(str).str.zfill(5),
+            "ARR": deps + (number // 300).astype(str),
+            "ZE2020": deps + (number // 100).astype(str).str.zfill(2),
+            "UU2020": deps + (number // 50).astype(str).str.zfill(3),
+            "BV2022": deps + (number // 30).astype(str).str.zfill(3),
+            "AAV2020": deps + (number // 150).astype(str),
+        }
+    )
+
+
+def write_sources(directory: Path, communes: int = 35_000, seed: int = 0) -> None:
+    """
+    Writes the three synthetic sources ("main", "dep" and "comp") in a directory,
+    to be used with CRIMESFRANCE_SOURCE_DIR.
+
+    Parameters:
+    -----------
+    directory: Path
+        The directory to write the files into.
+    communes: int
+        The number of communes to generate.
+    seed: int
+        The seed of the random generator.
+    """
+
+    df = make_main_dataset(communes, seed)
+
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "main").write_bytes(to_csv_gz(df))
+    (directory / "dep").write_bytes(to_csv_gz(make_dep_dataset(df)))
+
+    with pd.ExcelWriter(directory / "comp", engine="openpyxl") as writer:
+        make_comp_dataset(df).to_excel(
+            writer, sheet_name="zonages supracommunaux", index=False
+        )
+
+
+def to_csv_gz(df: pd.DataFrame) -> bytes:
+    """
+    Serializes a DataFrame the way data.gouv.fr publishes it (";" separated, gzipped).
+    """
+
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=1) as f:
+        df.to_csv(f, sep=";", index=False)
+    return buffer.getvalue()
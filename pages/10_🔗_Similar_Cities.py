@@ -0,0 +1,77 @@
+import streamlit as st
+import altair as alt
+from tools.config import YEARS
+from tools.utility import set_page, load_comp_dataset, get_similar_cities
+
+
+def similar_cities() -> None:
+    set_page("Similar Cities")
+
+    df_comp = load_comp_dataset()
+
+    col1, col2 = st.columns(2)
+    with col1:
+        city = st.selectbox(
+            "City", df_comp["city_dep"].unique(), placeholder="Select a city"
+        )
+    with col2:
+        year = st.slider("Year", *YEARS, YEARS[1])
+
+    col1, col2 = st.columns(2)
+    with col1:
+        k = st.slider("Number of similar cities", 5, 50, 10)
+    with col2:
+        activated = st.toggle("Only cities of a similar size")
+
+    df_similar = get_similar_cities(str(city), year, k)
+    if df_similar.empty:
+        st.warning(f"There is no crime data for {city} in {year}.")
+        return
+
+    if activated:
+        population = df_similar["population"].iloc[0]
+        df_similar = get_similar_cities(
+            str(city), year, k, population / 2, population * 2
+        )
+
+    if len(df_similar) == 1:
+        st.warning(f"No city is similar to {city} in {year}.")
+        return
+
+    st.dataframe(df_similar, use_container_width=True, hide_index=True)
+
+    categories = df_similar.columns[3:]
+    df_profiles = df_similar.head(6).melt(
+        id_vars=["city_dep"],
+        value_vars=categories,
+        var_name="classe",
+        value_name="faits_per_1000",
+    )
+    chart = (
+        alt.Chart(df_profiles)
+        .mark_bar()
+        .encode(
+            x=alt.X("city_dep:N", sort=None, title=None, axis=alt.Axis(labels=False)),
+            y=alt.Y("faits_per_1000:Q", title="Crimes per 1000 inhabitants"),
+            color=alt.Color("city_dep:N", sort=None, title="City"),
+            column=alt.Column("classe:N", title=None),
+            tooltip=["city_dep", "classe", "faits_per_1000"],
+        )
+        .properties(width=60, title=f"{city} and its 5 most similar cities in {year}")
+    )
+    st.altair_chart(chart)
+
+    st.info(
+        """
+        Each city is described by its number of crimes per 1000 inhabitants in every category.
+        The rates are log-scaled and standardized, so that rare crimes like homicides weigh as
+        much as frequent ones like thefts, then the cities are compared by Euclidean distance.
+
+        Small cities have few crimes, so their profiles are noisier: compare them with cities
+        of a similar size.
+        """
+    )
+
+
+if __name__ == "__main__":
+    similar_cities()
@@ -0,0 +1,109 @@
+import numpy as np
+import streamlit as st
+from tools.config import YEARS
+from tools.utility import (
+    set_page,
+    get_explorer_index,
+    get_explorer_page,
+    export_explorer_rows,
+)
+
+
+def explorer() -> None:
+    set_page("Explorer")
+
+    df_table = get_explorer_index().table
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        years = st.multiselect(
+            "Years", list(range(YEARS[0], YEARS[1] + 1)), placeholder="All"
+        )
+    with col2:
+        classes = st.multiselect(
+            "Categories", df_table["classe"].cat.categories, placeholder="All"
+        )
+    with col3:
+        departments = st.multiselect(
+            "Departments", df_table["DEP"].cat.categories, placeholder="All"
+        )
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        min_population = st.number_input("Minimum population", 0, value=0, step=1000)
+    with col2:
+        max_population = st.number_input(
+            "Maximum population (0 for no limit)", 0, value=0, step=1000
+        )
+    with col3:
+        columns = {
+            "CODGEO": "City code",
+            "faits": "Number of crimes",
+            "POP": "Population",
+            "faits_per_1000": "Crimes per 1000 inhabitants",
+        }
+        sort_by = st.selectbox(
+            "Sort by", list(columns), format_func=lambda column: columns[column]
+        )
+    with col4:
+        page_size = st.selectbox("Rows per page", [25, 50, 100, 200], index=1)
+        ascending = not st.toggle("Descending order")
+
+    page = st.number_input("Page", min_value=1, value=1)
+
+    df_page, total = get_explorer_page(
+        tuple(sorted(years)),
+        tuple(sorted(classes)),
+        tuple(sorted(departments)),
+        min_population,
+        max_population or np.inf,
+        sort_by,
+        ascending,
+        page - 1,
+        page_size,
+    )
+
+    pages = max(-(-total // page_size), 1)
+    st.caption(
+        f"Page {min(page, pages)} of {pages}, "
+        f"{format(total, ',').replace(',', ' ')} rows match the filters."
+    )
+    st.dataframe(df_page, use_container_width=True, hide_index=True)
+
+    st.subheader("Export")
+    # only the gzipped CSV is offered: the file is kept in memory for each session
+    prepare = st.button(
+        f"Export the {format(total, ',').replace(',', ' ')} rows to CSV (gzip)",
+        disabled=total == 0,
+    )
+
+    if prepare:
+        with st.spinner("Writing the file..."):
+            data = export_explorer_rows(
+                tuple(sorted(years)),
+                tuple(sorted(classes)),
+                tuple(sorted(departments)),
+                min_population,
+                max_population or np.inf,
+            )
+        st.download_button(
+            f"Download crimes.csv.gz ({len(data) / 1e6:.1f} MB)",
+            data,
+            file_name="crimes.csv.gz",
+            mime="application/gzip",
+        )
+
+    st.info(
+        """
+        Only the rows of the page are sent to your browser: the filters and the sorting are
+        done on the server, so the whole dataset can be explored without downloading it.
+        The rows matching the filters can be exported to a gzipped CSV file, or to CSV and Parquet
+        with the command `python -m tools.export`.
+
+        The population for 2021 and 2022 are not yet available, so their values is the same as 2020.
+        """
+    )
+
+
+if __name__ == "__main__":
+    explorer()
@@ -3,7 +3,7 @@ import pandas as pd
 import altair as alt
 from tools.utility import (
     set_page,
-    load_main_dataset,
+    load_star_schema,
     load_dep_dataset,
     get_crimes_per_year,
     center_metrics,
@@ -13,7 +13,7 @@ from tools.utility import (
 def dataset_info() -> None:
     set_page("General Info")
 
-    df = load_main_dataset()
+    star = load_star_schema()
     df_dep = load_dep_dataset()
     df_year = get_crimes_per_year()
 
@@ -21,7 +21,7 @@ def dataset_info() -> None:
     with col1:
         st.metric(
             label="Size of main dataset",
-            value=f"{df.memory_usage().sum() / 1_000_000:.2f} MB",
+            value=f"{sum(table.memory_usage().sum() for table in star) / 1_000_000:.2f} MB",
         )
 
     with col2:
@@ -1,23 +1,14 @@
 import streamlit as st
-from tools.utility import set_page, get_crimes_per_year_by_category
-import plotly.express as px
+from tools.config import YEARS
+from tools.charts import proportion_pie
+from tools.utility import set_page
 
 
 def proportion() -> None:
     set_page("Proportion")
 
-    year = st.slider("Year", 2016, 2022, 2016)
-    df_year = get_crimes_per_year_by_category(year)
-
-    fig = px.pie(
-        df_year,
-        values="faits",
-        names=df_year["classe"],
-        title=f"Crimes in {year} in France",
-    )
-    fig.update_traces(textposition="inside", textinfo="percent+label")
-    fig.update_layout(height=600, width=800)
-    st.plotly_chart(fig, use_container_width=True)
+    year = st.slider("Year", *YEARS, YEARS[0])
+    st.plotly_chart(proportion_pie(year), use_container_width=True)
 
     st.info(
         """
@@ -1,14 +1,20 @@
 import streamlit as st
 import pandas as pd
+from tools.config import YEARS
+from tools.charts import (
+    city_category_lines,
+    city_category_pie,
+    city_population_line,
+    city_trend_bars,
+    city_year_bars,
+)
 from tools.utility import (
     set_page,
     load_comp_dataset,
     get_crimes_per_category_by_city,
-    get_crimes_per_year_by_city,
+    get_city_percentiles,
+    get_city_trends,
 )
-import plotly.graph_objects as go
-import plotly.express as px
-import altair as alt
 
 
 def city() -> None:
@@ -54,12 +60,7 @@ def city() -> None:
             )
 
     with col2:
-        df_city_pop = get_crimes_per_year_by_city(str(city))
-        fig = px.line(
-            df_city_pop, x="annee", y="population", title=f"Population of {city}"
-        )
-        # fig.update_layout(width=800, height=500)
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(city_population_line(str(city)), use_container_width=True)
 
     if df_city["faits"].sum() == 0:
         st.warning(f"There is no crime data for {city}.")
@@ -67,52 +68,73 @@ def city() -> None:
         col1, col2 = st.columns(2)
 
         with col1:
-            fig = px.pie(
-                df_city,
-                values="faits",
-                names="classe",
-                title=f"Crimes in {city} by category",
-            )
-            fig.update_layout(width=800, height=500)
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(city_category_pie(str(city)), use_container_width=True)
 
         with col2:
-            chart = (
-                alt.Chart(df_city)
-                .mark_bar()
-                .encode(
-                    x=alt.X("annee:O", axis=alt.Axis(labelAngle=0), title="Year"),
-                    y=alt.Y(
-                        "faits:Q", stack="zero", sort="-x", title="Number of crimes"
-                    ),
-                    color="classe:N",
-                )
-                .properties(
-                    title=f"Crimes in {city} by year",
-                    width=800,
-                    height=600,
-                )
-            )
-
-            st.altair_chart(chart, use_container_width=True)
+            st.vega_lite_chart(city_year_bars(str(city)), use_container_width=True)
 
     if df_city["faits"].sum() != 0:
-        fig = go.Figure()
-        for classe in df_city["classe"].unique():
-            df_classe = df_city[df_city["classe"] == classe]
-            fig.add_trace(
-                go.Scatter(
-                    x=df_classe["annee"],
-                    y=df_classe["faits"],
-                    name=classe,
-                )
+        st.plotly_chart(city_category_lines(str(city)), use_container_width=True)
+
+    st.subheader(f"How does {city} compare?")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        year = st.slider("Year", *YEARS, YEARS[1])
+    with col2:
+        df_percentiles = get_city_percentiles(str(city), year)
+        category = st.selectbox("Category", df_percentiles["classe"])
+
+    df_category = df_percentiles[df_percentiles["classe"] == category]
+    if df_category.empty or df_category["faits_per_1000"].isna().all():
+        st.warning(f"There is no crime data for {city} in {year}.")
+    else:
+        row = df_category.iloc[0]
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric(
+                label="Crimes per 1000 inhabitants",
+                value=f"{row['faits_per_1000']:.2f}",
+            )
+        with col2:
+            st.metric(
+                label="Percentile in France",
+                value=f"{row['national_percentile']:.1f}",
+            )
+        with col3:
+            st.metric(
+                label="Percentile in its department",
+                value=f"{row['department_percentile']:.1f}",
             )
-        fig.update_layout(
-            title=f"Total crimes in {city} by year",
-            xaxis_title="Year",
-            yaxis_title="Number of crimes",
+        st.caption(
+            f"A percentile of 90 means that {city} has more crimes per inhabitant "
+            "than 90% of the cities with data."
+        )
+
+    st.subheader(f"Trends in {city}")
+
+    df_trends = get_city_trends(str(city)).dropna(subset=["slope"])
+    if df_trends.empty:
+        st.warning(f"There is not enough crime data in {city} to compute trends.")
+    else:
+        st.vega_lite_chart(city_trend_bars(str(city)), use_container_width=True)
+
+        st.dataframe(
+            df_trends.rename(
+                columns={
+                    "slope": "crimes per year",
+                    "relative_slope": "change per year (%)",
+                    "projection": f"projection ({df_trends['projection_year'].iloc[0]})",
+                }
+            ).drop(columns="projection_year"),
+            use_container_width=True,
+            hide_index=True,
+        )
+        st.caption(
+            "The trend is a straight line fitted to the number of crimes of each year. "
+            "The black lines are the 95% confidence intervals: when they cross 0, "
+            "the trend may be due to chance."
         )
-        st.plotly_chart(fig, use_container_width=True)
 
     st.divider()
 
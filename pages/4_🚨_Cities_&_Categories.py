@@ -1,11 +1,15 @@
 import streamlit as st
-from tools.utility import set_page, load_main_dataset, get_most_dangerous_cities
+from tools.config import YEARS
+from tools.utility import set_page, load_star_schema, get_most_dangerous_cities
 
 
 def category_repartition() -> None:
     set_page("Cities & Categories")
 
-    df = load_main_dataset()
+    df_facts = load_star_schema().facts
+
+    # in low-memory mode, only the configured years are loaded
+    first_year, last_year = YEARS
 
     col1, col2 = st.columns(2)
     with col1:
@@ -13,16 +17,16 @@ def category_repartition() -> None:
         with col3:
             year = st.slider(
                 "Year",
-                2016,
-                2022,
-                2016,
+                first_year,
+                last_year,
+                first_year,
             )
         with col4:
             activated = st.toggle("Toggle crime per capita")
 
         category = st.selectbox(
             "Category",
-            df["classe"].unique(),
+            df_facts["classe"].unique(),
             index=0,
         )
 
@@ -1,59 +1,45 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import pydeck as pdk
-from tools.utility import load_dep_dataset, set_page, get_df_dep_lat_lon
+from tools.charts import (
+    department_choropleth,
+    department_columns,
+    department_commune_bars,
+    department_polygons,
+)
+from tools.config import YEARS
+from tools.geometry import ZOOM_LEVELS
+from tools.utility import (
+    set_page,
+    get_crime_cube,
+    get_department_communes,
+    get_department_index,
+)
 
 
 def france_map() -> None:
     set_page("Map")
 
-    df_dep = load_dep_dataset()
+    # without the boundaries (see tools.geometry) the map has columns and no zoom
+    boundaries = department_polygons(ZOOM_LEVELS[0]) is not None
 
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
 
     with col1:
         year = st.slider(
             "Year",
-            2016,
-            2022,
-            2016,
+            *YEARS,
+            YEARS[0],
         )
 
     with col2:
         activated = st.toggle("Toggle crime per capita")
 
-    df_dep_lat_lon = get_df_dep_lat_lon(df_dep, year)
-    elevation = "faits_per_hab" if activated else "faits"
-    elevation_scale = 2_000_000 if activated else 1
-
-    layer = (
-        pdk.Layer(
-            "ColumnLayer",
-            data=df_dep_lat_lon,
-            get_position=["lon", "lat"],
-            auto_highlight=True,
-            get_elevation=elevation,
-            elevation_scale=elevation_scale,
-            radius=10_000,
-            get_fill_color=[255, 140, 0],
-            pickable=True,
-        ),
-    )
-    r = pdk.Deck(
-        map_style="",
-        initial_view_state=pdk.ViewState(
-            latitude=46.2276,
-            longitude=2.2137,
-            zoom=4,
-            pitch=50,
-        ),
-        layers=[layer],
-        tooltip={
-            "html": "<b>Department:</b> {Code.département} <br/> <b>Crimes by hab:</b> {faits_per_hab}",
-            "style": {"color": "white"},
-        },
-    )
+    zoom = ZOOM_LEVELS[0]
+    if boundaries:
+        with col3:
+            zoom_names = dict(zip(ZOOM_LEVELS, ["France", "Region", "Department"]))
+            zoom = st.select_slider(
+                "Zoom", ZOOM_LEVELS, format_func=lambda zoom: zoom_names[zoom]
+            )
 
     st.markdown(
         f"""
@@ -63,13 +49,56 @@ def france_map() -> None:
         """,
         unsafe_allow_html=True,
     )
-    st.pydeck_chart(r)
+    # the map is drawn once the department is selected, to center it there
+    map_container = st.container()
+
+    st.subheader("Communes of a department")
+    col1, col2 = st.columns(2)
+    with col1:
+        departments = [dep for dep in get_department_index().departments if dep]
+        department = st.selectbox("Department", departments)
+    with col2:
+        category = st.selectbox(
+            "Category", ["All", *get_crime_cube().classes], key="department_category"
+        )
+    category = None if category == "All" else category
 
+    df_department = get_department_communes(department, year, category)
+    st.caption(
+        f"{len(df_department)} communes, "
+        f"{df_department['faits'].sum():,.0f} crimes in {year}".replace(",", " ")
+    )
+    st.vega_lite_chart(
+        department_commune_bars(department, year, category, activated),
+        use_container_width=True,
+    )
+    st.dataframe(df_department, use_container_width=True, hide_index=True)
+
+    with map_container:
+        if boundaries:
+            deck = department_choropleth(year, activated, zoom, department)
+        else:
+            st.caption(
+                "The boundaries of the departments aren't built, "
+                "see `python -m tools.geometry --help`."
+            )
+            deck = department_columns(year, activated)
+        st.pydeck_chart(deck)
+
+    zoom_help = (
+        "The zoom slider draws the boundaries with more detail, "
+        "centered on the department selected below."
+        if boundaries
+        else ""
+    )
     st.success(
-        """
+        f"""
         The map is interactive, you can zoom in and out, and hover on a department to see its name and the number of crimes.
+        {zoom_help}
 
         You can also see the overseas departments, like Guadeloupe, Martinique, Guyane, Réunion and Mayotte.
+
+        Below the map, pick a department to see the number of crimes of each of its communes.
         """
     )
 
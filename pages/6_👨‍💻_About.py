@@ -36,6 +36,16 @@ def about() -> None:
                 🏙️ City: [Plotly](https://plotly.com/python) and [Altair](https://altair-viz.github.io)
 
                 🗺️ Map: [Pydeck](https://deckgl.readthedocs.io/en/latest)
+
+                ⚖️ Compare: [Altair](https://altair-viz.github.io)
+
+                🔎 Anomalies: [NumPy](https://numpy.org)
+
+                🧩 Zones: [Altair](https://altair-viz.github.io)
+
+                🔗 Similar Cities: [NumPy](https://numpy.org)
+
+                📋 Explorer: [Pandas](https://pandas.pydata.org)
                 """
     )
 
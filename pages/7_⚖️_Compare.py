@@ -0,0 +1,98 @@
+import streamlit as st
+import altair as alt
+from tools.config import YEARS
+from tools.utility import (
+    set_page,
+    load_comp_dataset,
+    get_crimes_by_cities,
+)
+
+
+def compare() -> None:
+    set_page("Compare")
+
+    df_comp = load_comp_dataset()
+    all_cities = df_comp["city_dep"].unique()
+    default_cities = [
+        city
+        for city in ["Paris (75)", "Marseille (13)", "Lyon (69)"]
+        if city in set(all_cities)
+    ]
+
+    cities = st.multiselect(
+        "Cities",
+        all_cities,
+        default=default_cities,
+        placeholder="Select cities to compare",
+    )
+
+    if not cities:
+        st.warning("Select at least one city to compare.")
+        return
+
+    df_cities = get_crimes_by_cities(tuple(sorted(cities)))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        category = st.selectbox(
+            "Category",
+            ["All categories"] + sorted(df_cities["classe"].unique()),
+            index=0,
+        )
+    with col2:
+        activated = st.toggle("Toggle crime per capita")
+
+    if category != "All categories":
+        df_cities = df_cities[df_cities["classe"] == category]
+
+    df_year = df_cities.groupby(["city_dep", "annee"], as_index=False).agg(
+        faits=("faits", "sum"), population=("population", "first")
+    )
+    df_year["faits_per_1000"] = (df_year["faits"] / df_year["population"] * 1000).round(
+        2
+    )
+
+    value = "faits_per_1000" if activated else "faits"
+    title = "Crimes per 1000 inhabitants" if activated else "Number of crimes"
+
+    chart = (
+        alt.Chart(df_year)
+        .mark_line(size=5, point=True)
+        .encode(
+            x=alt.X("annee:O", axis=alt.Axis(labelAngle=0), title="Year"),
+            y=alt.Y(f"{value}:Q", title=title),
+            color=alt.Color("city_dep:N", title="City"),
+            tooltip=["city_dep", "annee", "faits", "population", "faits_per_1000"],
+        )
+        .properties(title=f"{title} by year ({category})", height=450)
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+    year = st.slider("Year", *YEARS, YEARS[1])
+    df_split = df_cities[df_cities["annee"] == year]
+
+    chart = (
+        alt.Chart(df_split)
+        .mark_bar()
+        .encode(
+            x=alt.X(f"sum({value}):Q", title=title),
+            y=alt.Y("city_dep:N", title="City"),
+            color=alt.Color("classe:N", title="Category"),
+            tooltip=["city_dep", "classe", "faits", "faits_per_1000"],
+        )
+        .properties(title=f"Crimes in {year} by category", height=80 * len(cities))
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+    st.info(
+        """
+        The population for 2021 and 2022 are not yet available, so their values is the same as 2020.
+
+        Use the toggle to compare cities of different sizes: big cities have more crimes,
+        but not always more crimes per inhabitant.
+        """
+    )
+
+
+if __name__ == "__main__":
+    compare()
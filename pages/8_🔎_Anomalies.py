@@ -0,0 +1,91 @@
+import streamlit as st
+from tools.utility import (
+    ANOMALY_MIN_COUNT,
+    ANOMALY_MIN_ZSCORE,
+    set_page,
+    get_yoy_anomalies,
+)
+
+
+def anomalies() -> None:
+    set_page("Anomalies")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        min_count = st.slider(
+            "Minimum crimes in the previous year", ANOMALY_MIN_COUNT, 200, 20
+        )
+    with col2:
+        min_zscore = st.slider(
+            "Minimum z-score", ANOMALY_MIN_ZSCORE, 10.0, 3.0, step=0.5
+        )
+    with col3:
+        activated = st.toggle("Only show increases", value=True)
+
+    # the scan is cached once with the loosest guards, the sliders only filter it
+    df_anomalies = get_yoy_anomalies()
+    df_anomalies = df_anomalies[
+        (df_anomalies["faits_previous_year"] >= min_count)
+        & (df_anomalies["zscore"].abs() >= min_zscore)
+    ]
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        category = st.selectbox(
+            "Category",
+            ["All categories"] + sorted(df_anomalies["classe"].unique()),
+        )
+    with col2:
+        year = st.selectbox(
+            "Year", ["All years"] + sorted(df_anomalies["annee"].unique())
+        )
+    with col3:
+        department = st.selectbox(
+            "Department",
+            ["All departments"] + sorted(df_anomalies["DEP"].dropna().unique()),
+        )
+
+    if activated:
+        df_anomalies = df_anomalies[df_anomalies["zscore"] > 0]
+    if category != "All categories":
+        df_anomalies = df_anomalies[df_anomalies["classe"] == category]
+    if year != "All years":
+        df_anomalies = df_anomalies[df_anomalies["annee"] == year]
+    if department != "All departments":
+        df_anomalies = df_anomalies[df_anomalies["DEP"] == department]
+
+    st.metric(
+        label="Anomalies found",
+        value=format(len(df_anomalies), ",").replace(",", " "),
+    )
+    st.caption("The 500 strongest anomalies are shown.")
+    st.dataframe(
+        df_anomalies.head(500).rename(
+            columns={
+                "faits_previous_year": "faits (previous year)",
+                "relative_change": "change (%)",
+            }
+        ),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    st.info(
+        r"""
+        For each city, category and year, we compute the relative change of the number of crimes
+        compared to the previous year. This change is then compared to the changes of all the other
+        cities for the same category and year with a robust z-score:
+
+        $$z = \frac{change - median(changes)}{1.4826 * MAD(changes)}$$
+
+        Where MAD is the median absolute deviation. Cities with less than 5 crimes in the previous year are left out,
+        since a change from 1 to 5 crimes is a +400% increase that means nothing.
+        The sliders then hide the cities with fewer crimes in the previous year, or a smaller z-score.
+
+        For example, the increase in use of drugs in 2020 in the Bouches-du-Rhône department stands out.
+        """
+    )
+
+
+if __name__ == "__main__":
+    anomalies()
@@ -0,0 +1,87 @@
+import streamlit as st
+import altair as alt
+from tools.config import YEARS
+from tools.schema import ZONE_COLUMNS
+from tools.utility import set_page, get_crimes_by_zone
+
+
+def zones() -> None:
+    set_page("Zones")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        level = st.selectbox(
+            "Zone", list(ZONE_COLUMNS), format_func=lambda level: ZONE_COLUMNS[level]
+        )
+    with col2:
+        year = st.slider("Year", *YEARS, YEARS[1])
+
+    df_zones = get_crimes_by_zone(level)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        category = st.selectbox(
+            "Category", ["All categories"] + sorted(df_zones["classe"].unique())
+        )
+    with col2:
+        activated = st.toggle("Toggle crime per capita")
+
+    if category != "All categories":
+        df_zones = df_zones[df_zones["classe"] == category]
+
+    # each category has its own population, the cities whose crimes are published,
+    # so the rate of all the categories is the sum of their rates
+    df_total = df_zones.groupby(["zone", "label", "annee"], as_index=False).agg(
+        communes=("communes", "first"),
+        faits=("faits", "sum"),
+        population=("population", "max"),
+        faits_per_1000=("faits_per_1000", "sum"),
+    )
+
+    value = "faits_per_1000" if activated else "faits"
+    title = "Crimes per 1000 inhabitants" if activated else "Number of crimes"
+
+    df_year = df_total[df_total["annee"] == year].sort_values(value, ascending=False)
+    st.metric(label=f"Number of zones ({ZONE_COLUMNS[level]})", value=len(df_year))
+
+    chart = (
+        alt.Chart(df_year.head(20))
+        .mark_bar()
+        .encode(
+            x=alt.X(f"{value}:Q", title=title),
+            y=alt.Y("label:N", sort="-x", title=ZONE_COLUMNS[level]),
+            tooltip=["label", "communes", "faits", "population", "faits_per_1000"],
+        )
+        .properties(title=f"Top 20 zones in {year} ({category})", height=600)
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+    zone = st.selectbox("Zone details", df_year["label"])
+    chart = (
+        alt.Chart(df_total[df_total["label"] == zone])
+        .mark_line(size=5, point=True)
+        .encode(
+            x=alt.X("annee:O", axis=alt.Axis(labelAngle=0), title="Year"),
+            y=alt.Y(f"{value}:Q", title=title),
+            tooltip=["annee", "faits", "population", "faits_per_1000"],
+        )
+        .properties(title=f"{title} in {zone} by year ({category})")
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+    st.dataframe(df_year, use_container_width=True, hide_index=True)
+
+    st.info(
+        """
+        Cities are grouped by the zones of the INSEE: intercommunalities, arrondissements,
+        employment zones, urban units, living areas and attraction areas of cities.
+        Each zone is named after its code and its most populated city.
+
+        The crimes of small cities are not always published, so they are left out of the zone totals,
+        and their population is left out of the rates of the categories they are missing in.
+        """
+    )
+
+
+if __name__ == "__main__":
+    zones()
@@ -0,0 +1,161 @@
+import hashlib
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tools.download import DownloadError, download
+
+
+CONTENT = bytes(range(256)) * 4096
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    Serves server.content with its ETag, failing the requests as told by server.script:
+    "drop" closes the connection in the middle of the body, "503" answers 503,
+    "corrupt" sends other bytes and "ok" serves the file (the default).
+    """
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        server = self.server
+        server.requests.append(dict(self.headers))
+        action = server.script.pop(0) if server.script else "ok"
+
+        if action == "503":
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if self.headers.get("If-None-Match") == server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        content = server.content
+        if action == "corrupt":
+            content = bytes(255 - byte for byte in content)
+
+        start = 0
+        if "Range" in self.headers and self.headers.get("If-Range") in (
+            None,
+            server.etag,
+        ):
+            start = int(self.headers["Range"].split("=")[1].rstrip("-"))
+
+        self.send_response(206 if start else 200)
+        self.send_header("ETag", server.etag)
+        self.send_header("Content-Length", str(len(content) - start))
+        if start:
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}"
+            )
+        self.end_headers()
+
+        if action == "drop":
+            self.wfile.write(content[start : start + (len(content) - start) // 2])
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_RDWR)
+            self.close_connection = True
+            return
+        self.wfile.write(content[start:])
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    server.content = CONTENT
+    server.etag = '"v1"'
+    server.script = []
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/file"
+
+
+def sha256(content: bytes) -> tuple[str, str]:
+    return "sha256", hashlib.sha256(content).hexdigest()
+
+
+def test_resumes_after_dropped_connections_and_server_errors(server, tmp_path):
+    server.script = ["drop", "503", "drop"]
+    path = tmp_path / "file"
+
+    digest = download(url(server), path, expected_hash=sha256(CONTENT), backoff=0)
+
+    assert path.read_bytes() == CONTENT
+    assert digest == sha256(CONTENT)[1]
+    assert (tmp_path / "file.etag").read_text() == '"v1"'
+    assert not (tmp_path / "file.part").exists()
+    # the drops were resumed from the bytes already received
+    assert any("Range" in headers for headers in server.requests)
+
+
+def test_gives_up_after_the_retries(server, tmp_path):
+    server.script = ["503"] * 3
+    path = tmp_path / "file"
+
+    with pytest.raises(DownloadError):
+        download(url(server), path, retries=2, backoff=0)
+
+    assert not path.exists()
+    assert len(server.requests) == 3
+
+
+def test_rejects_corrupted_bytes(server, tmp_path):
+    server.script = ["corrupt"]
+    path = tmp_path / "file"
+
+    with pytest.raises(DownloadError):
+        download(url(server), path, expected_hash=sha256(CONTENT), retries=0)
+
+    assert not path.exists()
+    assert not (tmp_path / "file.part").exists()
+    assert not (tmp_path / "file.etag").exists()
+
+
+def test_rejected_update_is_downloaded_again(server, tmp_path):
+    path = tmp_path / "file"
+    download(url(server), path, expected_hash=sha256(CONTENT))
+
+    # the file changes on the server, but its first download is corrupted
+    server.content = CONTENT[::-1]
+    server.etag = '"v2"'
+    server.script = ["corrupt"]
+    with pytest.raises(DownloadError):
+        download(url(server), path, expected_hash=sha256(server.content), retries=0)
+    assert path.read_bytes() == CONTENT
+    assert (tmp_path / "file.etag").read_text() == '"v1"'
+
+    # the next attempt asks with the ETag of the file kept, not of the rejected one
+    download(url(server), path, expected_hash=sha256(server.content), retries=0)
+    assert server.requests[-1].get("If-None-Match") == '"v1"'
+    assert path.read_bytes() == CONTENT[::-1]
+    assert (tmp_path / "file.etag").read_text() == '"v2"'
+
+
+def test_not_modified_file_is_checked_against_its_hash(server, tmp_path):
+    path = tmp_path / "file"
+    download(url(server), path)
+    path.write_bytes(b"tampered")
+
+    digest = download(url(server), path, expected_hash=sha256(CONTENT), retries=0)
+
+    # the 304 was not trusted, the file was downloaded again
+    assert [headers.get("If-None-Match") for headers in server.requests[1:]] == [
+        '"v1"',
+        None,
+    ]
+    assert path.read_bytes() == CONTENT
+    assert digest == sha256(CONTENT)[1]
@@ -0,0 +1,615 @@
+import warnings
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from tools.schema import StarSchema, fill_missing_population
+
+
+class CrimeCube(NamedTuple):
+    """
+    The fact table of the star schema as dense arrays, for vectorized computations.
+
+    codes: (n,) CODGEO of the communes, in the order of the categories of the facts
+    classes: (c,) the categories of crimes
+    years: (y,) the years, e.g. 2016
+    faits: (n, c, y) number of crimes, NaN when not published
+    population: (n, y) population, with 2021 and 2022 filled with 2020
+    """
+
+    codes: np.ndarray
+    classes: np.ndarray
+    years: np.ndarray
+    faits: np.ndarray
+    population: np.ndarray
+
+
+def build_crime_cube(star: StarSchema) -> CrimeCube:
+    """
+    Builds the commune x class x year matrix of the number of crimes.
+
+    Parameters:
+    -----------
+    star: StarSchema
+        The star schema, as returned by load_star_schema.
+
+    Returns:
+    --------
+    CrimeCube
+        The dense arrays of the number of crimes and of the population.
+    """
+
+    df_facts = star.facts
+    codes = np.asarray(df_facts["CODGEO"].cat.categories, dtype=str)
+    classes = np.asarray(df_facts["classe"].cat.categories, dtype=str)
+    years = np.sort(df_facts["annee"].unique()).astype(int)
+
+    year_index = np.searchsorted(years, df_facts["annee"].to_numpy())
+    faits = np.full((len(codes), len(classes), len(years)), np.nan)
+    faits[
+        df_facts["CODGEO"].cat.codes.to_numpy(),
+        df_facts["classe"].cat.codes.to_numpy(),
+        year_index,
+    ] = df_facts["faits"].to_numpy()
+
+    df_population = fill_missing_population(star.commune_year)
+    df_population = df_population[df_population["annee"].isin(years)]
+    population = np.full((len(codes), len(years)), np.nan)
+    population[
+        df_population["CODGEO"].cat.codes.to_numpy(),
+        np.searchsorted(years, df_population["annee"].to_numpy()),
+    ] = df_population["POP"].to_numpy()
+
+    return CrimeCube(codes, classes, years + 2000, faits, population)
+
+
+def year_position(cube: CrimeCube, year: int) -> int | None:
+    """
+    Returns the position of a year in the last axis of the cube,
+    or None when the year isn't loaded (see CRIMESFRANCE_YEARS).
+    """
+
+    position = int(np.searchsorted(cube.years, year))
+    if position == len(cube.years) or cube.years[position] != year:
+        return None
+    return position
+
+
+def robust_zscores(values: np.ndarray, axis: int = 0) -> np.ndarray:
+    """
+    Returns the robust z-scores of values along an axis: the distance to the
+    median in median absolute deviations, so that a few outliers don't hide others.
+
+    Parameters:
+    -----------
+    values: np.ndarray
+        The values, NaN being ignored.
+    axis: int
+        The axis along which the median and deviation are computed.
+
+    Returns:
+    --------
+    np.ndarray
+        The z-scores, NaN when the deviation is 0.
+    """
+
+    # slices without any value get a NaN median, which np.errstate doesn't silence
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        median = np.nanmedian(values, axis=axis, keepdims=True)
+        mad = np.nanmedian(np.abs(values - median), axis=axis, keepdims=True)
+
+    # 1.4826 makes the MAD match the standard deviation of a normal distribution
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(mad > 0, (values - median) / (1.4826 * mad), np.nan)
+
+
+def yoy_anomalies(cube: CrimeCube, min_count: int, min_zscore: float) -> pd.DataFrame:
+    """
+    Scans every commune, class and year for unusual year-over-year changes.
+    The relative change of each commune is compared to the changes of all the
+    communes for the same class and year with a robust z-score.
+
+    Parameters:
+    -----------
+    cube: CrimeCube
+        The cube, as returned by build_crime_cube.
+    min_count: int
+        The minimum number of crimes in the previous year: small counts make
+        large relative changes that are not meaningful.
+    min_zscore: float
+        The minimum absolute z-score of the changes to return.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame with one row per anomaly, sorted by decreasing absolute z-score.
+    """
+
+    previous = cube.faits[:, :, :-1]
+    current = cube.faits[:, :, 1:]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.where(
+            previous >= min_count, (current - previous) / previous * 100, np.nan
+        )
+
+    zscores = robust_zscores(change, axis=0)
+    communes, classes, years = np.nonzero(np.abs(zscores) >= min_zscore)
+
+    df_anomalies = pd.DataFrame(
+        {
+            "CODGEO": cube.codes[communes],
+            "classe": cube.classes[classes],
+            "annee": cube.years[years + 1],
+            "faits_previous_year": previous[communes, classes, years],
+            "faits": current[communes, classes, years],
+            "relative_change": change[communes, classes, years].round(2),
+            "zscore": zscores[communes, classes, years].round(2),
+        }
+    )
+
+    order = np.argsort(-np.abs(df_anomalies["zscore"].to_numpy()), kind="stable")
+    return df_anomalies.iloc[order].reset_index(drop=True)
+
+
+class PercentileIndex(NamedTuple):
+    """
+    Sorted per-capita rates of every commune, to rank a commune in O(log n).
+
+    national: (c, y, n) rates sorted for each class and year, NaN last
+    national_count: (c, y) number of communes with a rate
+    departments: (d,) department codes
+    department_of: (n,) position in departments of each commune of the cube
+    by_department: (c, y, n) rates grouped by department, sorted in each group, NaN last
+    offsets: (d + 1,) start of each department in the last axis of by_department
+    department_count: (c, y, d) number of communes with a rate in each department
+    """
+
+    national: np.ndarray
+    national_count: np.ndarray
+    departments: np.ndarray
+    department_of: np.ndarray
+    by_department: np.ndarray
+    offsets: np.ndarray
+    department_count: np.ndarray
+
+
+def per_capita_rates(
+    cube: CrimeCube, communes: np.ndarray | slice = slice(None)
+) -> np.ndarray:
+    """
+    Returns the number of crimes per 1000 inhabitants of the cube, shaped (n, c, y),
+    or only of some communes given by their positions.
+    """
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = cube.faits[communes] / cube.population[communes, np.newaxis, :] * 1000
+    return np.where(np.isfinite(rates), rates, np.nan)
+
+
+def build_percentile_index(cube: CrimeCube, departments: np.ndarray) -> PercentileIndex:
+    """
+    Sorts the per-capita rates of all the communes, nationally and per department.
+
+    Parameters:
+    -----------
+    cube: CrimeCube
+        The cube, as returned by build_crime_cube.
+    departments: np.ndarray
+        The department of each commune of the cube.
+
+    Returns:
+    --------
+    PercentileIndex
+        The sorted rates, see percentile_ranks.
+    """
+
+    # float32 halves the memory, the rates looked up are cast the same way
+    rates = per_capita_rates(cube).transpose(1, 2, 0).astype(np.float32)
+
+    national = np.sort(rates, axis=-1)
+    national_count = np.isfinite(rates).sum(axis=-1)
+
+    department_names, department_of = np.unique(departments, return_inverse=True)
+    order = np.argsort(department_of, kind="stable")
+    offsets = np.searchsorted(
+        department_of[order], np.arange(len(department_names) + 1)
+    )
+
+    # one vectorized sort per department, over all the classes and years at once
+    by_department = rates[:, :, order]
+    for start, stop in zip(offsets[:-1], offsets[1:]):
+        by_department[:, :, start:stop] = np.sort(
+            by_department[:, :, start:stop], axis=-1
+        )
+    department_count = np.add.reduceat(
+        np.isfinite(rates[:, :, order]).astype(np.int32), offsets[:-1], axis=-1
+    )
+
+    return PercentileIndex(
+        national,
+        national_count,
+        department_names,
+        department_of,
+        by_department,
+        offsets,
+        department_count,
+    )
+
+
+def percentile_ranks(
+    index: PercentileIndex, commune: int, rates: np.ndarray, year: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the percentile of a commune's rates among all communes and among the
+    communes of its department, for each class, by binary search.
+
+    Parameters:
+    -----------
+    index: PercentileIndex
+        The index, as returned by build_percentile_index.
+    commune: int
+        The position of the commune in the cube.
+    rates: np.ndarray
+        The (c,) rates of the commune for the year, see per_capita_rates.
+    year: int
+        The position of the year in the cube.
+
+    Returns:
+    --------
+    tuple[np.ndarray, np.ndarray]
+        The (c,) national and departmental percentiles, NaN when the rate is unknown.
+    """
+
+    department = index.department_of[commune]
+    start = index.offsets[department]
+
+    national = np.full(len(rates), np.nan)
+    departmental = np.full(len(rates), np.nan)
+
+    for classe, rate in enumerate(rates.astype(np.float32)):
+        if np.isnan(rate):
+            continue
+
+        count = index.national_count[classe, year]
+        values = index.national[classe, year, :count]
+        national[classe] = np.searchsorted(values, rate, side="right") / count * 100
+
+        count = index.department_count[classe, year, department]
+        values = index.by_department[classe, year, start : start + count]
+        departmental[classe] = np.searchsorted(values, rate, side="right") / count * 100
+
+    return national, departmental
+
+
+class ZoneMembership(NamedTuple):
+    """
+    The zone of every commune of a cube, for one level of zones (e.g. EPCI).
+
+    zones: (z,) the zone codes
+    zone_of: (n,) position in zones of each commune of the cube, -1 when unknown
+    """
+
+    zones: np.ndarray
+    zone_of: np.ndarray
+
+
+def build_zone_membership(codes: np.ndarray, zone_codes: pd.Series) -> ZoneMembership:
+    """
+    Encodes the zone of each commune as an integer.
+
+    Parameters:
+    -----------
+    codes: np.ndarray
+        The CODGEO of the communes, as in CrimeCube.codes.
+    zone_codes: pd.Series
+        The zone code of the communes, indexed by CODGEO.
+
+    Returns:
+    --------
+    ZoneMembership
+        The zones and the position of the zone of each commune.
+    """
+
+    zone_codes = zone_codes[~zone_codes.index.duplicated()].reindex(codes)
+    known = zone_codes.notna().to_numpy()
+
+    zones, positions = np.unique(zone_codes[known].astype(str), return_inverse=True)
+    zone_of = np.full(len(codes), -1, dtype=np.int32)
+    zone_of[known] = positions
+    return ZoneMembership(zones, zone_of)
+
+
+def zone_rollup(
+    cube: CrimeCube, membership: ZoneMembership
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Sums the crimes and the population of the communes of each zone.
+    All the classes and years are summed by a single bincount over the flattened cube.
+    The population of a zone only counts, for each class and year, the communes whose
+    crimes are published, so that the unpublished ones don't lower its rates.
+
+    Parameters:
+    -----------
+    cube: CrimeCube
+        The cube, as returned by build_crime_cube.
+    membership: ZoneMembership
+        The zones of the communes of the cube, see build_zone_membership.
+
+    Returns:
+    --------
+    tuple[np.ndarray, np.ndarray]
+        The (z, c, y) number of crimes and population of the zones.
+    """
+
+    known = membership.zone_of >= 0
+    zone_of = membership.zone_of[known].astype(np.intp)
+    n_zones = len(membership.zones)
+
+    def rollup(values: np.ndarray) -> np.ndarray:
+        # flat index of (zone, *other axes) for every cell of the communes' values
+        cells = values[0].size
+        index = zone_of.reshape(-1, *[1] * (values.ndim - 1)) * cells + np.arange(
+            cells
+        ).reshape(values.shape[1:])
+        sums = np.bincount(
+            index.ravel(), np.nan_to_num(values).ravel(), minlength=n_zones * cells
+        )
+        return sums.reshape(n_zones, *values.shape[1:])
+
+    faits = cube.faits[known]
+    population = np.where(np.isnan(faits), 0, cube.population[known, np.newaxis, :])
+    return rollup(faits), rollup(population)
+
+
+class DepartmentIndex(NamedTuple):
+    """
+    The communes of a cube grouped by department, to get the communes of a department
+    as a slice instead of scanning all the communes.
+
+    departments: (d,) department codes
+    communes: (n,) positions in the cube of the communes, grouped by department
+    labels: (n,) names of the communes, in the order of communes
+    offsets: (d + 1,) start of each department in communes
+    """
+
+    departments: np.ndarray
+    communes: np.ndarray
+    labels: np.ndarray
+    offsets: np.ndarray
+
+
+def build_department_index(
+    departments: np.ndarray, labels: np.ndarray
+) -> DepartmentIndex:
+    """
+    Groups the communes of a cube by department.
+
+    Parameters:
+    -----------
+    departments: np.ndarray
+        The department of each commune of the cube.
+    labels: np.ndarray
+        The name of each commune of the cube.
+
+    Returns:
+    --------
+    DepartmentIndex
+        The communes grouped by department, see department_communes.
+    """
+
+    department_names, department_of = np.unique(departments, return_inverse=True)
+    order = np.argsort(department_of, kind="stable")
+    offsets = np.searchsorted(
+        department_of[order], np.arange(len(department_names) + 1)
+    )
+    return DepartmentIndex(
+        department_names, order.astype(np.int32), labels[order], offsets
+    )
+
+
+def department_communes(index: DepartmentIndex, department: str) -> slice:
+    """
+    Returns the slice of index.communes and index.labels of the communes of a department,
+    found by binary search. The slice is empty for an unknown department.
+    """
+
+    position = np.searchsorted(index.departments, department)
+    if position == len(index.departments) or index.departments[position] != department:
+        return slice(0, 0)
+    return slice(index.offsets[position], index.offsets[position + 1])
+
+
+class ProfileIndex(NamedTuple):
+    """
+    The crime profile of every commune of a cube for one year, to find similar communes.
+
+    profiles: (n, c) log per-capita rates standardized for each class, float32
+    squared_norms: (n,) squared norm of each profile
+    population: (n,) population of the communes
+    valid: (n,) communes with a population and at least one published number of crimes
+    """
+
+    profiles: np.ndarray
+    squared_norms: np.ndarray
+    population: np.ndarray
+    valid: np.ndarray
+
+
+def build_profile_index(cube: CrimeCube, year: int) -> ProfileIndex:
+    """
+    Builds the crime profile of every commune for a year.
+    The rates are log-scaled then standardized so that every class weighs the same
+    in the distance, whether it is frequent (thefts) or rare (homicides).
+
+    Parameters:
+    -----------
+    cube: CrimeCube
+        The cube, as returned by build_crime_cube.
+    year: int
+        The position of the year in the cube.
+
+    Returns:
+    --------
+    ProfileIndex
+        The profiles, see nearest_profiles.
+    """
+
+    rates = per_capita_rates(cube)[:, :, year]
+    population = cube.population[:, year]
+    valid = (population > 0) & np.isfinite(rates).any(axis=1)
+
+    # crimes that are not published are too few to be published, so about 0
+    features = np.log1p(np.nan_to_num(rates))
+    mean = features[valid].mean(axis=0)
+    std = features[valid].std(axis=0)
+    profiles = ((features - mean) / np.where(std > 0, std, 1)).astype(np.float32)
+    profiles[~valid] = 0
+
+    squared_norms = np.einsum("ij,ij->i", profiles, profiles)
+    return ProfileIndex(profiles, squared_norms, population, valid)
+
+
+def nearest_profiles(
+    index: ProfileIndex,
+    commune: int,
+    k: int,
+    min_population: float = 0,
+    max_population: float = np.inf,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the k communes with the closest profiles to a commune, by Euclidean distance.
+    The distances to all the communes come from one matrix-vector product, and only
+    the k closest are sorted.
+
+    Parameters:
+    -----------
+    index: ProfileIndex
+        The index, as returned by build_profile_index.
+    commune: int
+        The position of the commune in the cube.
+    k: int
+        The number of communes to return.
+    min_population: float
+        The minimum population of the communes to return.
+    max_population: float
+        The maximum population of the communes to return.
+
+    Returns:
+    --------
+    tuple[np.ndarray, np.ndarray]
+        The positions of the closest communes in the cube and their distances,
+        from the closest. Empty when the commune has no profile.
+    """
+
+    if not index.valid[commune]:
+        return np.array([], dtype=np.intp), np.array([], dtype=np.float32)
+
+    # |a - b|^2 = |a|^2 - 2 a.b + |b|^2
+    query = index.profiles[commune]
+    distances = (
+        index.squared_norms
+        - 2 * (index.profiles @ query)
+        + index.squared_norms[commune]
+    )
+
+    candidates = (
+        index.valid
+        & (index.population >= min_population)
+        & (index.population <= max_population)
+    )
+    candidates[commune] = False
+    distances = np.where(candidates, distances, np.inf)
+
+    k = min(k, int(candidates.sum()))
+    if k == 0:
+        return np.array([], dtype=np.intp), np.array([], dtype=np.float32)
+
+    nearest = np.argpartition(distances, k - 1)[:k]
+
+    # the expansion loses precision in float32, so the k distances are recomputed
+    distances = np.sqrt(np.square(index.profiles[nearest] - query).sum(axis=1))
+    order = np.argsort(distances, kind="stable")
+    return nearest[order], distances[order]
+
+
+# 97.5% quantiles of the Student t distribution by degrees of freedom, for 95% intervals
+T_QUANTILES = np.array(
+    [np.nan, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228]
+)
+
+
+class Trends(NamedTuple):
+    """
+    The linear trend of the number of crimes of every commune and class of a cube.
+
+    slope: (n, c) crimes per year
+    ci: (n, c) half-width of the 95% confidence interval of the slope
+    projection: (n, c) number of crimes projected for the year after the last one
+    mean: (n, c) mean number of crimes over the years used
+    points: (n, c) number of years with a published number of crimes
+    """
+
+    slope: np.ndarray
+    ci: np.ndarray
+    projection: np.ndarray
+    mean: np.ndarray
+    points: np.ndarray
+
+
+def fit_trends(cube: CrimeCube) -> Trends:
+    """
+    Fits a least-squares line to the number of crimes by year of every commune and class.
+    Years without a published number are left out of each fit, so instead of one
+    lstsq call the normal equations of all the series are solved at once from their
+    masked sums.
+
+    Parameters:
+    -----------
+    cube: CrimeCube
+        The cube, as returned by build_crime_cube.
+
+    Returns:
+    --------
+    Trends
+        The slopes, their confidence intervals and the projections,
+        NaN for the series with less than 3 published years.
+    """
+
+    # centered years keep the sums small and the solve well conditioned
+    x = (cube.years - cube.years.mean()).astype(np.float64)
+    known = np.isfinite(cube.faits)
+    y = np.where(known, cube.faits, 0)
+
+    points = known.sum(axis=-1)
+    sx = known @ x
+    sxx = known @ (x * x)
+    sy = y.sum(axis=-1)
+    sxy = y @ x
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_x = sx / points
+        mean = sy / points
+        # sums of squares around the means of the years used
+        ssx = sxx - sx * mean_x
+        slope = (sxy - sx * mean) / ssx
+        intercept = mean - slope * mean_x
+
+        residuals = np.where(known, y - intercept[..., None] - slope[..., None] * x, 0)
+        dof = points - 2
+        stderr = np.sqrt((residuals**2).sum(axis=-1) / dof / ssx)
+
+    t = T_QUANTILES[np.clip(dof, 0, len(T_QUANTILES) - 1)]
+    t = np.where(dof >= len(T_QUANTILES), 1.96, t)
+
+    fitted = points >= 3
+    slope = np.where(fitted, slope, np.nan)
+    ci = np.where(fitted, t * stderr, np.nan)
+    # a decreasing trend can't project a negative number of crimes
+    projection = np.where(
+        fitted, np.maximum(intercept + slope * (x[-1] + 1), 0), np.nan
+    )
+
+    return Trends(slope, ci, projection, mean, points)
@@ -0,0 +1,362 @@
+import argparse
+import functools
+import hashlib
+import json
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+import pyarrow as pa
+
+from tools.cache import CODE_VERSION, attach_script_context
+from tools.config import YEARS
+from tools.sources import dataset_version
+from tools.utility import (
+    get_crimes_per_category_by_city,
+    get_crimes_per_year,
+    get_crimes_per_year_by_category,
+    get_crimes_per_year_by_city,
+    get_most_dangerous_cities,
+    load_star_schema,
+)
+
+
+# formats of the responses and their MIME types
+RESPONSE_FORMATS = {
+    "json": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# the responses only change with the data, clients revalidate them with their ETag
+CACHE_CONTROL = "public, max-age=300"
+
+# number of serialized responses kept in memory
+RESPONSE_CACHE_ENTRIES = 1024
+
+
+class ApiError(Exception):
+    """
+    Raised by an endpoint for a request it can't answer, with the HTTP status to return.
+    """
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _param(params: dict[str, str], name: str) -> str:
+    """
+    Returns a required query parameter.
+    """
+
+    if name not in params:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"missing parameter {name!r}")
+    return params[name]
+
+
+def _year(params: dict[str, str]) -> int:
+    """
+    Returns the "year" query parameter, e.g. 2016.
+    """
+
+    year = _param(params, "year")
+    if not year.isdigit() or not YEARS[0] <= int(year) <= YEARS[1]:
+        raise ApiError(
+            HTTPStatus.BAD_REQUEST, f"year must be between {YEARS[0]} and {YEARS[1]}"
+        )
+    return int(year)
+
+
+@functools.lru_cache(maxsize=1)
+def _city_names(version: str) -> frozenset[str]:
+    """
+    Returns the names of the cities, as "LIBGEO (DEP)", for a version of the data.
+    """
+
+    return frozenset(load_star_schema().communes["city_dep"])
+
+
+def _city(params: dict[str, str]) -> str:
+    """
+    Returns the "city" query parameter, as "LIBGEO (DEP)".
+    """
+
+    city = _param(params, "city")
+    if city not in _city_names(data_version()):
+        raise ApiError(HTTPStatus.NOT_FOUND, f"unknown city {city!r}")
+    return city
+
+
+def cities(params: dict[str, str]) -> pd.DataFrame:
+    """
+    The cities, with their code, name and department.
+    """
+
+    return load_star_schema().communes
+
+
+def years(params: dict[str, str]) -> pd.DataFrame:
+    """
+    The number of crimes in France by year.
+    """
+
+    return get_crimes_per_year()
+
+
+def categories(params: dict[str, str]) -> pd.DataFrame:
+    """
+    The number of crimes in France by category for a year.
+    Parameters: year.
+    """
+
+    return get_crimes_per_year_by_category(_year(params))
+
+
+def city_years(params: dict[str, str]) -> pd.DataFrame:
+    """
+    The number of crimes and the population of a city by year.
+    Parameters: city, as "LIBGEO (DEP)".
+    """
+
+    return get_crimes_per_year_by_city(_city(params))
+
+
+def city_categories(params: dict[str, str]) -> pd.DataFrame:
+    """
+    The number of crimes of a city by year and category.
+    Parameters: city, as "LIBGEO (DEP)".
+    """
+
+    df_city = get_crimes_per_category_by_city(_city(params))
+    df_city = df_city[["annee", "classe", "faits", "POP"]].astype({"annee": int})
+    df_city["annee"] += 2000
+    return df_city
+
+
+def top_cities(params: dict[str, str]) -> pd.DataFrame:
+    """
+    The 10 cities with the most crimes of a category for a year.
+    Parameters: year, category, per_capita (0 or 1, to rank by crimes per inhabitant).
+    """
+
+    year = _year(params)
+    category = _param(params, "category")
+    if category not in load_star_schema().facts["classe"].cat.categories:
+        raise ApiError(HTTPStatus.NOT_FOUND, f"unknown category {category!r}")
+    per_capita = params.get("per_capita", "0") == "1"
+    return get_most_dangerous_cities(year, category, per_capita)
+
+
+ENDPOINTS: dict[str, Callable[[dict[str, str]], pd.DataFrame]] = {
+    "/v1/cities": cities,
+    "/v1/years": years,
+    "/v1/categories": categories,
+    "/v1/city/years": city_years,
+    "/v1/city/categories": city_categories,
+    "/v1/top-cities": top_cities,
+}
+
+
+def data_version() -> str:
+    """
+    Returns the version of the responses, which changes with the code and the data.
+    """
+
+    version = f"{CODE_VERSION}-{dataset_version()}"
+    return hashlib.sha256(version.encode()).hexdigest()[:16]
+
+
+def serialize(df: pd.DataFrame, fmt: str) -> bytes:
+    """
+    Serializes a query result to JSON records or to an Arrow IPC stream.
+
+    Parameters:
+    -----------
+    df: pd.DataFrame
+        The result of an endpoint.
+    fmt: str
+        The format, see RESPONSE_FORMATS.
+
+    Returns:
+    --------
+    bytes
+        The body of the response.
+    """
+
+    df = df.reset_index(drop=True)
+    categorical = df.select_dtypes("category").columns
+    df[categorical] = df[categorical].astype(str)
+
+    if fmt == "json":
+        return df.to_json(orient="records", force_ascii=False).encode()
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+@functools.lru_cache(maxsize=RESPONSE_CACHE_ENTRIES)
+def render(version: str, path: str, params: tuple, fmt: str) -> bytes:
+    """
+    Returns the serialized response of an endpoint, cached by version and parameters.
+    Errors are not cached.
+    """
+
+    return serialize(ENDPOINTS[path](dict(params)), fmt)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET requests to the endpoints with JSON or Arrow, and 304 to the valid
+    requests whose If-None-Match matches the version of the data.
+    """
+
+    # keeps the connections open between requests
+    protocol_version = "HTTP/1.1"
+    # the headers and the body are sent separately, without waiting for an ACK
+    disable_nagle_algorithm = True
+    quiet = False
+
+    def setup(self) -> None:
+        super().setup()
+        # each connection is handled by a thread, which needs a session for the caches
+        attach_script_context(f"api-{threading.get_ident()}")
+
+    def log_message(self, format: str, *args) -> None:
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def do_HEAD(self) -> None:
+        self.do_GET(body=False)
+
+    def do_GET(self, body: bool = True) -> None:
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+
+        if url.path in ("/", "/v1"):
+            index = {
+                path: " ".join(endpoint.__doc__.split())
+                for path, endpoint in ENDPOINTS.items()
+            }
+            return self._send_json(HTTPStatus.OK, index, body)
+        if url.path not in ENDPOINTS:
+            return self._send_json(
+                HTTPStatus.NOT_FOUND, {"error": f"unknown endpoint {url.path}"}, body
+            )
+
+        fmt = params.pop("format", None)
+        if fmt is None:
+            accept = self.headers.get("Accept", "")
+            fmt = "arrow" if RESPONSE_FORMATS["arrow"] in accept else "json"
+        if fmt not in RESPONSE_FORMATS:
+            return self._send_json(
+                HTTPStatus.BAD_REQUEST, {"error": f"unknown format {fmt!r}"}, body
+            )
+
+        version = data_version()
+        etag = f'"{version}-{fmt}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": CACHE_CONTROL,
+            "Vary": "Accept",
+        }
+
+        # the ETag is the same for every parameter, so they are validated by rendering
+        # the response before answering 304, a lookup in the cache once rendered
+        try:
+            content = render(version, url.path, tuple(sorted(params.items())), fmt)
+        except ApiError as e:
+            return self._send_json(e.status, {"error": str(e)}, body)
+
+        if_none_match = self.headers.get("If-None-Match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or (
+            if_none_match.strip() == "*"
+        ):
+            return self._send(HTTPStatus.NOT_MODIFIED, b"", None, headers, body)
+
+        self._send(HTTPStatus.OK, content, RESPONSE_FORMATS[fmt], headers, body)
+
+    def _send_json(self, status: HTTPStatus, content: dict, body: bool) -> None:
+        data = json.dumps(content, ensure_ascii=False).encode()
+        self._send(status, data, RESPONSE_FORMATS["json"], {}, body)
+
+    def _send(
+        self,
+        status: HTTPStatus,
+        content: bytes,
+        content_type: str | None,
+        headers: dict[str, str],
+        body: bool,
+    ) -> None:
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        # a 304 has no body, its length would be the one of the cached response
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if body and content:
+            self.wfile.write(content)
+
+
+def make_server(host: str, port: int, quiet: bool = False) -> ThreadingHTTPServer:
+    """
+    Loads the datasets and creates the HTTP server of the API.
+
+    Parameters:
+    -----------
+    host: str
+        The address to listen on.
+    port: int
+        The port to listen on, 0 for any free port.
+    quiet: bool
+        Whether to log the requests.
+
+    Returns:
+    --------
+    ThreadingHTTPServer
+        The server, call serve_forever to start it.
+    """
+
+    # loads the datasets once, before the first request
+    attach_script_context("api")
+    load_star_schema()
+
+    handler = type("ApiHandler", (ApiHandler,), {"quiet": quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Serves the aggregates of the dashboard as JSON or Arrow over HTTP."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--quiet", action="store_true", help="don't log the requests")
+    args = parser.parse_args()
+
+    import streamlit.logger
+
+    streamlit.logger.set_log_level("error")
+
+    server = make_server(args.host, args.port, args.quiet)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import functools
+import hashlib
+import pickle
+import shutil
+import threading
+import uuid
+import zlib
+from pathlib import Path
+from typing import Any, Callable
+
+import pandas as pd
+
+from tools.config import CACHE_DIR, LOW_MEMORY, PERSISTENT_CACHE, YEARS
+from tools.sources import dataset_version
+
+
+def _code_version() -> str:
+    """
+    Returns a hash of the source code of the data layer (every module in tools/)
+    and of the settings changing what is loaded.
+    """
+
+    digest = hashlib.sha256(repr((LOW_MEMORY, YEARS)).encode())
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+CODE_VERSION = _code_version()
+
+
+def _hash_value(value: Any) -> bytes:
+    """
+    Returns a stable representation of a parameter, used to build the cache keys.
+    """
+
+    if isinstance(value, pd.DataFrame):
+        hashes = pd.util.hash_pandas_object(value, index=True).values
+        return repr(list(value.columns)).encode() + hashes.tobytes()
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _params_key(args: tuple, kwargs: dict) -> str:
+    """
+    Returns a hash of the parameters of a call.
+    """
+
+    digest = hashlib.sha256()
+    for value in (*args, *sorted(kwargs.items())):
+        digest.update(_hash_value(value))
+    return digest.hexdigest()[:32]
+
+
+def persistent_cache(func: Callable) -> Callable:
+    """
+    Caches the results of a function on disk, so that they survive restarts.
+    The results are stored under a version made of the code version and the
+    content hash of the sources: they are invalidated as soon as either changes.
+
+    Use it below @st.cache_data, which keeps serving the results from memory.
+    Nothing is evicted within a version, one file per distinct call: keep it for
+    expensive builds called with few distinct parameters, not for per-city lookups.
+
+    Parameters:
+    -----------
+    func: Callable
+        The function to cache. Its parameters and result must be picklable.
+
+    Returns:
+    --------
+    Callable
+        The decorated function.
+    """
+
+    func_dir = CACHE_DIR / "results" / f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not PERSISTENT_CACHE:
+            return func(*args, **kwargs)
+
+        version_dir = func_dir / f"{CODE_VERSION}-{dataset_version()}"
+        path = version_dir / f"{_params_key(args, kwargs)}.pkl.z"
+
+        try:
+            return pickle.loads(zlib.decompress(path.read_bytes()))
+        except FileNotFoundError:
+            pass
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError):
+            # a corrupted entry is computed again and overwritten
+            path.unlink(missing_ok=True)
+
+        result = func(*args, **kwargs)
+
+        try:
+            if not version_dir.exists():
+                # results of an older code or data version can't be read anymore
+                # each is renamed before being deleted, so that a single process
+                # deletes it when several start with the new version at once
+                for old_dir in func_dir.glob("*"):
+                    if old_dir.name == version_dir.name:
+                        continue
+                    trash = func_dir / f".{uuid.uuid4().hex}.deleted"
+                    try:
+                        old_dir.rename(trash)
+                    except FileNotFoundError:
+                        continue
+                    shutil.rmtree(trash, ignore_errors=True)
+                version_dir.mkdir(parents=True, exist_ok=True)
+
+            content = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+            tmp_path.write_bytes(zlib.compress(content, 1))
+            tmp_path.replace(path)
+        except OSError:
+            # the cache is best effort, a read-only disk only disables it
+            pass
+
+        return result
+
+    return wrapper
+
+
+def attach_script_context(session_id: str):
+    """
+    Attaches a Streamlit session to the current thread, as the server does for each
+    browser tab. Without it, st.cache_data and st.cache_resource never store their
+    results, so the query helpers must run in a session outside of the app
+    (e.g. in the API or the load test). The messages they send to the browser are dropped.
+
+    Parameters:
+    -----------
+    session_id: str
+        The id of the session.
+
+    Returns:
+    --------
+    ScriptRunContext
+        The context attached to the thread.
+    """
+
+    from streamlit.runtime.memory_uploaded_file_manager import (
+        MemoryUploadedFileManager,
+    )
+    from streamlit.runtime.scriptrunner import ScriptRunContext, add_script_run_ctx
+    from streamlit.runtime.state import SafeSessionState, SessionState
+
+    ctx = ScriptRunContext(
+        session_id=session_id,
+        _enqueue=lambda msg: None,
+        query_string="",
+        session_state=SafeSessionState(SessionState()),
+        uploaded_file_mgr=MemoryUploadedFileManager("/_stcore/upload_file"),
+        page_script_hash="",
+        user_info={"email": None},
+    )
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return ctx
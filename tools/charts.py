@@ -0,0 +1,404 @@
+import functools
+import json
+from typing import Callable
+
+import altair as alt
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import pydeck as pdk
+import streamlit as st
+
+from tools.cache import CODE_VERSION
+from tools.geometry import ZOOM_LEVELS, load_polygons
+from tools.sources import dataset_version
+from tools.utility import (
+    DEPARTMENT_DATA,
+    get_city_trends,
+    get_crimes_per_category_by_city,
+    get_crimes_per_year_by_category,
+    get_crimes_per_year_by_city,
+    get_department_communes,
+    get_df_dep_lat_lon,
+    load_dep_dataset,
+)
+
+
+# number of charts kept for each kind of chart
+RENDER_CACHE_ENTRIES = 512
+
+# colors of the departments on the map, from the fewest to the most crimes
+CHOROPLETH_COLORS = np.array(
+    [[255, 255, 178], [254, 204, 92], [253, 141, 60], [240, 59, 32], [189, 0, 38]]
+)
+
+DEPARTMENT_TOOLTIP = {
+    "html": "<b>Department:</b> {Code.département} <br/> <b>Crimes by hab:</b> {faits_per_hab}",
+    "style": {"color": "white"},
+}
+
+
+def render_cache(func: Callable) -> Callable:
+    """
+    Caches the charts built by a function, so that a rerun with the same parameters
+    skips building and serializing the chart again.
+    The charts are keyed by the function (the kind of chart), the version of the code
+    and of the dataset, and the parameters. They are shared by all the sessions
+    without being copied: don't modify them.
+
+    Parameters:
+    -----------
+    func: Callable
+        A function returning a chart to pass to st.plotly_chart, st.vega_lite_chart
+        or st.pydeck_chart.
+
+    Returns:
+    --------
+    Callable
+        The function with its charts cached.
+    """
+
+    # wraps makes st.cache_resource key the cache on func, not on render
+    @functools.wraps(func)
+    def render(version: str, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    render = st.cache_resource(max_entries=RENDER_CACHE_ENTRIES, show_spinner=False)(
+        render
+    )
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return render(f"{CODE_VERSION}-{dataset_version()}", *args, **kwargs)
+
+    return wrapper
+
+
+def altair_spec(chart: alt.TopLevelMixin) -> dict:
+    """
+    Serializes an Altair chart to a Vega-Lite spec for st.vega_lite_chart.
+    Like st.altair_chart, the data is kept as DataFrames in the "datasets" of the spec
+    and the default theme of Altair is left out.
+
+    Parameters:
+    -----------
+    chart: alt.TopLevelMixin
+        The chart.
+
+    Returns:
+    --------
+    dict
+        The Vega-Lite spec.
+    """
+
+    datasets = {}
+
+    def transform(data: pd.DataFrame) -> dict:
+        name = f"data-{len(datasets)}"
+        datasets[name] = data
+        return {"name": name}
+
+    alt.data_transformers.register("render_cache", transform)
+    with alt.themes.enable("none"), alt.data_transformers.enable("render_cache"):
+        spec = chart.to_dict()
+
+    spec["datasets"] = datasets
+    return spec
+
+
+class SerializedDeck:
+    """
+    A pydeck.Deck serialized to JSON, which st.pydeck_chart accepts in place of the Deck.
+    The tooltip isn't part of the JSON, it is given again with the one of the Deck.
+    The data of a layer can be given already serialized, in place of a placeholder string.
+    """
+
+    def __init__(
+        self,
+        deck: pdk.Deck,
+        tooltip: dict | None = None,
+        data: dict[str, str] | None = None,
+    ):
+        self.json = deck.to_json()
+        for placeholder, serialized in (data or {}).items():
+            self.json = self.json.replace(json.dumps(placeholder), serialized)
+        # st.pydeck_chart reads the tooltip of a Deck from this attribute
+        self._tooltip = tooltip
+
+    def to_json(self) -> str:
+        return self.json
+
+
+@render_cache
+def proportion_pie(year: int) -> go.Figure:
+    """
+    Returns the pie chart of the crimes in France by category for a year.
+    """
+
+    df_year = get_crimes_per_year_by_category(year)
+    fig = px.pie(
+        df_year,
+        values="faits",
+        names=df_year["classe"],
+        title=f"Crimes in {year} in France",
+    )
+    fig.update_traces(textposition="inside", textinfo="percent+label")
+    fig.update_layout(height=600, width=800)
+    return fig
+
+
+@render_cache
+def city_population_line(city: str) -> go.Figure:
+    """
+    Returns the line chart of the population of a city by year.
+    """
+
+    df_city_pop = get_crimes_per_year_by_city(city)
+    return px.line(
+        df_city_pop, x="annee", y="population", title=f"Population of {city}"
+    )
+
+
+@render_cache
+def city_category_pie(city: str) -> go.Figure:
+    """
+    Returns the pie chart of the crimes of a city by category.
+    """
+
+    df_city = get_crimes_per_category_by_city(city)
+    fig = px.pie(
+        df_city,
+        values="faits",
+        names="classe",
+        title=f"Crimes in {city} by category",
+    )
+    fig.update_layout(width=800, height=500)
+    return fig
+
+
+@render_cache
+def city_year_bars(city: str) -> dict:
+    """
+    Returns the Vega-Lite spec of the stacked bars of the crimes of a city by year.
+    """
+
+    df_city = get_crimes_per_category_by_city(city)
+    chart = (
+        alt.Chart(df_city)
+        .mark_bar()
+        .encode(
+            x=alt.X("annee:O", axis=alt.Axis(labelAngle=0), title="Year"),
+            y=alt.Y("faits:Q", stack="zero", sort="-x", title="Number of crimes"),
+            color="classe:N",
+        )
+        .properties(
+            title=f"Crimes in {city} by year",
+            width=800,
+            height=600,
+        )
+    )
+    return altair_spec(chart)
+
+
+@render_cache
+def city_category_lines(city: str) -> go.Figure:
+    """
+    Returns the line chart of the crimes of a city by year, one line per category.
+    """
+
+    df_city = get_crimes_per_category_by_city(city)
+    fig = go.Figure()
+    for classe in df_city["classe"].unique():
+        df_classe = df_city[df_city["classe"] == classe]
+        fig.add_trace(
+            go.Scatter(
+                x=df_classe["annee"],
+                y=df_classe["faits"],
+                name=classe,
+            )
+        )
+    fig.update_layout(
+        title=f"Total crimes in {city} by year",
+        xaxis_title="Year",
+        yaxis_title="Number of crimes",
+    )
+    return fig
+
+
+@render_cache
+def city_trend_bars(city: str) -> dict:
+    """
+    Returns the Vega-Lite spec of the yearly trend of the crimes of a city by category,
+    with their confidence intervals.
+    """
+
+    df_trends = get_city_trends(city).dropna(subset=["slope"])
+    base = alt.Chart(df_trends).encode(
+        y=alt.Y("classe:N", title="Category"),
+        tooltip=[
+            "classe",
+            "slope",
+            "ci_low",
+            "ci_high",
+            "relative_slope",
+            "projection",
+        ],
+    )
+    chart = base.mark_bar().encode(
+        x=alt.X("slope:Q", title="Crimes per year"),
+        color=alt.condition("datum.slope > 0", alt.value("red"), alt.value("green")),
+    ) + base.mark_rule(color="black").encode(x="ci_low:Q", x2="ci_high:Q")
+    return altair_spec(chart.properties(title=f"Yearly trend of crimes in {city}"))
+
+
+@render_cache
+def department_commune_bars(
+    department: str, year: int, category: str | None, activated: bool
+) -> dict:
+    """
+    Returns the Vega-Lite spec of the bars of the 20 communes of a department with the
+    most crimes for a year, per 1000 inhabitants when activated.
+    """
+
+    column = "faits_per_1000" if activated else "faits"
+    df_department = get_department_communes(department, year, category)
+    df_top = df_department.nlargest(20, column)
+
+    chart = (
+        alt.Chart(df_top)
+        .mark_bar()
+        .encode(
+            x=alt.X(
+                f"{column}:Q",
+                title="Crimes per 1000 inhabitants"
+                if activated
+                else "Number of crimes",
+            ),
+            y=alt.Y("LIBGEO:N", sort="-x", title=None),
+            tooltip=["CODGEO", "LIBGEO", "faits", "population", "faits_per_1000"],
+        )
+        .properties(title=f"Communes of the department {department} in {year}")
+    )
+    return altair_spec(chart)
+
+
+@render_cache
+def department_columns(year: int, activated: bool) -> SerializedDeck:
+    """
+    Returns the map of the crimes by department for a year,
+    as a column per department, per inhabitant when activated.
+    """
+
+    df_dep_lat_lon = get_df_dep_lat_lon(load_dep_dataset(), year)
+    elevation = "faits_per_hab" if activated else "faits"
+    elevation_scale = 2_000_000 if activated else 1
+
+    layer = (
+        pdk.Layer(
+            "ColumnLayer",
+            data=df_dep_lat_lon,
+            get_position=["lon", "lat"],
+            auto_highlight=True,
+            get_elevation=elevation,
+            elevation_scale=elevation_scale,
+            radius=10_000,
+            get_fill_color=[255, 140, 0],
+            pickable=True,
+        ),
+    )
+    deck = pdk.Deck(
+        map_style="",
+        initial_view_state=pdk.ViewState(
+            latitude=46.2276,
+            longitude=2.2137,
+            zoom=4,
+            pitch=50,
+        ),
+        layers=[layer],
+        tooltip=DEPARTMENT_TOOLTIP,
+    )
+    return SerializedDeck(deck, DEPARTMENT_TOOLTIP)
+
+
+@st.cache_resource(show_spinner=False)
+def department_polygons(zoom: int) -> list[tuple[str, str]] | None:
+    """
+    Returns the department code and the JSON of the rings of each polygon of the
+    departments simplified for a zoom level, or None when the geometry isn't built.
+    The geometry is serialized once and shared by the maps of all the years.
+    """
+
+    polygons = load_polygons(zoom)
+    if polygons is None:
+        return None
+    return [
+        (code, json.dumps(rings, separators=(",", ":"))) for code, rings in polygons
+    ]
+
+
+@render_cache
+def department_choropleth(
+    year: int, activated: bool, zoom: int, department: str | None = None
+) -> SerializedDeck | None:
+    """
+    Returns the map of the departments colored by their number of crimes for a year,
+    per inhabitant when activated, with the geometry of a zoom level.
+    The department given is outlined, and the map is centered on it when zoomed in.
+    Returns None when the geometry isn't built, see tools.geometry.
+    """
+
+    polygons = department_polygons(zoom)
+    if polygons is None:
+        return None
+
+    df_dep = get_df_dep_lat_lon(load_dep_dataset(), year)
+    values = df_dep["faits_per_hab" if activated else "faits"].to_numpy(float)
+    scaled = (values - values.min()) / max(values.max() - values.min(), 1e-12)
+    stops = np.linspace(0, 1, len(CHOROPLETH_COLORS))
+    colors = np.column_stack(
+        [np.interp(scaled, stops, channel) for channel in CHOROPLETH_COLORS.T]
+    ).astype(int)
+
+    # only the values of the year are serialized, the polygons are appended as is
+    rows = {}
+    for (_, dep), color in zip(df_dep.iterrows(), colors):
+        code = str(dep["Code.département"])
+        row = {
+            "Code.département": code,
+            "faits": int(dep["faits"]),
+            "faits_per_hab": round(float(dep["faits_per_hab"]), 5),
+            "color": [*color.tolist(), 200],
+            "line": [0, 0, 0] if code == department else [255, 255, 255],
+            "width": 3 if code == department else 1,
+        }
+        rows[code] = json.dumps(row, ensure_ascii=False)[:-1]
+    data = ",".join(
+        f'{rows[code]},"polygon":{rings}}}' for code, rings in polygons if code in rows
+    )
+
+    layer = pdk.Layer(
+        "PolygonLayer",
+        id="departments",
+        data="@@departments@@",
+        get_polygon="polygon",
+        get_fill_color="color",
+        get_line_color="line",
+        get_line_width="width",
+        line_width_units="pixels",
+        stroked=True,
+        auto_highlight=True,
+        pickable=True,
+    )
+    center = {"lat": 46.2276, "lon": 2.2137}
+    if zoom > ZOOM_LEVELS[0]:
+        center = DEPARTMENT_DATA.get(department, center)
+    deck = pdk.Deck(
+        map_style="",
+        initial_view_state=pdk.ViewState(
+            latitude=center["lat"], longitude=center["lon"], zoom=zoom
+        ),
+        layers=[layer],
+        tooltip=DEPARTMENT_TOOLTIP,
+    )
+    return SerializedDeck(deck, DEPARTMENT_TOOLTIP, {"@@departments@@": f"[{data}]"})
@@ -0,0 +1,74 @@
+import os
+from pathlib import Path
+
+
+# number of processes used to parse the communal dataset (0 means one per core)
+PARSE_WORKERS = int(os.environ.get("CRIMESFRANCE_PARSE_WORKERS", "0")) or (
+    os.cpu_count() or 1
+)
+
+# directory of the downloaded sources and of the persistent query cache
+CACHE_DIR = Path(os.environ.get("CRIMESFRANCE_CACHE_DIR", ".cache"))
+
+# set CRIMESFRANCE_PERSISTENT_CACHE=0 to only keep results in memory
+PERSISTENT_CACHE = os.environ.get("CRIMESFRANCE_PERSISTENT_CACHE", "1") != "0"
+
+# set CRIMESFRANCE_LOW_MEMORY=1 to only load the columns and years used by the app
+LOW_MEMORY = os.environ.get("CRIMESFRANCE_LOW_MEMORY", "0") == "1"
+
+# first and last years of the communal dataset
+DATASET_YEARS = (2016, 2022)
+
+
+def parse_years(value: str) -> tuple[int, int]:
+    """
+    Parses a range of years like "2019-2022".
+    The range must include 2020, the last year with a known city population,
+    which is used for 2021 and 2022.
+
+    Parameters:
+    -----------
+    value: str
+        The first and last years, separated by a dash.
+
+    Returns:
+    --------
+    tuple[int, int]
+        The first and last years.
+    """
+
+    bounds = value.split("-")
+    if len(bounds) != 2 or not all(bound.strip().isdigit() for bound in bounds):
+        raise ValueError(
+            f"CRIMESFRANCE_YEARS must be a range of years like 2019-2022, not {value!r}"
+        )
+
+    first_year, last_year = (int(bound) for bound in bounds)
+    if not DATASET_YEARS[0] <= first_year <= 2020 <= last_year <= DATASET_YEARS[1]:
+        raise ValueError(
+            f"CRIMESFRANCE_YEARS must be within {DATASET_YEARS[0]}-{DATASET_YEARS[1]} "
+            f"and include 2020, the last year with a known city population, not {value!r}"
+        )
+    return first_year, last_year
+
+
+# first and last years of the communal dataset loaded, which the pages offer:
+# set with CRIMESFRANCE_YEARS, e.g. "2019-2022", in low-memory mode, all of them otherwise
+YEARS = (
+    parse_years(os.environ.get("CRIMESFRANCE_YEARS", "2016-2022"))
+    if LOW_MEMORY
+    else DATASET_YEARS
+)
+
+# directory with local copies of the sources ("main", "dep" and "comp") used
+# instead of data.gouv.fr, e.g. for the load test
+SOURCE_DIR = os.environ.get("CRIMESFRANCE_SOURCE_DIR")
+
+# boundaries of the departments simplified for each zoom level of the map,
+# built with `python -m tools.geometry`, not bundled yet (the map shows columns without them)
+GEOMETRY_PATH = Path(
+    os.environ.get(
+        "CRIMESFRANCE_GEOMETRY_PATH",
+        Path(__file__).resolve().parent / "data" / "departments.npz",
+    )
+)
@@ -0,0 +1,242 @@
+import hashlib
+import random
+import time
+from pathlib import Path
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+
+# (connect, read) timeouts in seconds
+TIMEOUT = (10, 60)
+RETRIES = 5
+BACKOFF = 1.0
+CHUNK_SIZE = 1 << 20
+
+# errors worth retrying: the connection dropped, timed out or the server is busy
+RETRY_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    urllib3.exceptions.HTTPError,
+)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DownloadError(Exception):
+    """
+    Raised when a file can't be downloaded or doesn't match its expected size or hash.
+    """
+
+
+def make_session(pool_size: int = 4) -> requests.Session:
+    """
+    Creates a session reusing its connections across downloads.
+
+    Parameters:
+    -----------
+    pool_size: int
+        The number of connections kept open per host.
+
+    Returns:
+    --------
+    requests.Session
+        The session to pass to download.
+    """
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def file_hash(path: Path, algorithm: str = "sha256") -> str:
+    """
+    Returns the hex digest of a file, read by chunks.
+    """
+
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _total_size(response: requests.Response) -> int | None:
+    """
+    Returns the full size of the file from a 200 or 206 response, if the server sent it.
+    """
+
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+
+    length = response.headers.get("Content-Length")
+    return int(length) if length and response.status_code == 200 else None
+
+
+def _matches(path: Path, expected_hash: tuple[str, str]) -> bool:
+    """
+    Returns whether a file has the expected (algorithm, hex digest).
+    """
+
+    algorithm, value = expected_hash
+    return file_hash(path, algorithm) == value.lower()
+
+
+def _discard(*paths: Path) -> None:
+    """
+    Deletes a rejected download and its ETag.
+    """
+
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+def download(
+    url: str,
+    path: Path,
+    session: requests.Session | None = None,
+    expected_size: int | None = None,
+    expected_hash: tuple[str, str] | None = None,
+    timeout: tuple[float, float] = TIMEOUT,
+    retries: int = RETRIES,
+    backoff: float = BACKOFF,
+) -> str:
+    """
+    Downloads a file, resuming after failures.
+    The file is written to "<path>.part" and resumed from its last byte with a
+    HTTP Range request after a dropped connection, a timeout or a server error,
+    waiting backoff * 2^attempt seconds between attempts. It is moved to path
+    only once its size and hash are verified.
+
+    If path already exists and the server says it didn't change (ETag), it is kept
+    once checked against expected_hash. The ETag of a download is only stored as the
+    one of path once the file is verified, so a rejected update is downloaded again.
+
+    Parameters:
+    -----------
+    url: str
+        The URL of the file.
+    path: Path
+        Where to store the file.
+    session: requests.Session | None
+        The session to use, see make_session.
+    expected_size: int | None
+        The size of the file in bytes. Defaults to the size sent by the server.
+    expected_hash: tuple[str, str] | None
+        The (algorithm, hex digest) of the file, e.g. ("sha1", "8f3c...").
+    timeout: tuple[float, float]
+        The connect and read timeouts in seconds.
+    retries: int
+        The number of attempts after the first one.
+    backoff: float
+        The wait before the first retry in seconds.
+
+    Returns:
+    --------
+    str
+        The sha256 of the downloaded file.
+    """
+
+    session = session or make_session()
+    path = Path(path)
+    part_path = path.with_name(path.name + ".part")
+    etag_path = path.with_name(path.name + ".etag")
+    part_etag_path = path.with_name(path.name + ".part.etag")
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # the ETag of path, to ask whether it changed, and the one of the part being
+    # downloaded, to make sure we resume the same file; the ETag of the part only
+    # becomes the one of path once the part is verified
+    etag = etag_path.read_text() if etag_path.exists() and path.exists() else None
+    part_etag = part_etag_path.read_text() if part_etag_path.exists() else None
+    total = expected_size
+
+    attempt = 0
+    while True:
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if part_etag:
+                headers["If-Range"] = part_etag
+        elif etag:
+            headers["If-None-Match"] = etag
+
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+                if r.status_code == 304:
+                    if expected_hash is None or _matches(path, expected_hash):
+                        return file_hash(path)
+                    # the file kept doesn't match the published checksum anymore,
+                    # it is downloaded again without asking whether it changed
+                    etag = None
+                    etag_path.unlink(missing_ok=True)
+                    continue
+
+                if r.status_code == 416 and offset:
+                    # nothing left to download, unless the part is bigger than the file
+                    server_total = _total_size(r)
+                    if server_total is not None and server_total != offset:
+                        part_path.unlink()
+                        continue
+                    break
+
+                if r.status_code in RETRY_STATUSES:
+                    raise DownloadError(f"{url}: HTTP {r.status_code}")
+                if r.status_code not in (200, 206):
+                    r.raise_for_status()
+                    raise DownloadError(f"{url}: unexpected HTTP {r.status_code}")
+
+                # 200 means the server sent the whole file (no range support or new file)
+                mode = "ab" if r.status_code == 206 else "wb"
+                total = total or _total_size(r)
+                if mode == "wb" or r.headers.get("ETag"):
+                    part_etag = r.headers.get("ETag")
+                    if part_etag:
+                        part_etag_path.write_text(part_etag)
+                    else:
+                        part_etag_path.unlink(missing_ok=True)
+
+                # the bytes are stored as sent, sizes and hashes refer to them
+                with open(part_path, mode) as f:
+                    for chunk in r.raw.stream(CHUNK_SIZE, decode_content=False):
+                        f.write(chunk)
+
+            size = part_path.stat().st_size
+            if total is None or size >= total:
+                break
+            # the connection was closed before the end of the file
+            raise DownloadError(f"{url}: got {size} of {total} bytes")
+
+        except (*RETRY_ERRORS, DownloadError) as e:
+            if attempt == retries:
+                raise DownloadError(
+                    f"{url}: failed after {retries + 1} attempts"
+                ) from e
+            time.sleep(backoff * 2**attempt * (1 + random.random() / 2))
+            attempt += 1
+
+    if not part_path.exists():
+        raise DownloadError(f"{url}: nothing was downloaded")
+
+    size = part_path.stat().st_size
+    if total is not None and size != total:
+        _discard(part_path, part_etag_path)
+        raise DownloadError(f"{url}: expected {total} bytes, got {size}")
+
+    if expected_hash is not None and not _matches(part_path, expected_hash):
+        _discard(part_path, part_etag_path)
+        raise DownloadError(f"{url}: {expected_hash[0]} mismatch")
+
+    # the file and its ETag are replaced together, once the file is verified
+    part_path.replace(path)
+    if part_etag_path.exists():
+        part_etag_path.replace(etag_path)
+    else:
+        etag_path.unlink(missing_ok=True)
+    return file_hash(path)
@@ -0,0 +1,223 @@
+import argparse
+import gzip
+import sys
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from tools.schema import ExplorerIndex, explorer_mask
+
+
+# formats of the exports and their MIME types
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "csv.gz": "application/gzip",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# number of rows of the table read at once, which bounds the memory of an export
+CHUNK_ROWS = 200_000
+
+
+def export_chunks(
+    df: pd.DataFrame, mask: np.ndarray, chunk_rows: int = CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    """
+    Yields the rows of a table matching a mask, chunk by chunk, with the years in full.
+
+    Parameters:
+    -----------
+    df: pd.DataFrame
+        The table of an ExplorerIndex.
+    mask: np.ndarray
+        The rows to export, see tools.schema.explorer_mask.
+    chunk_rows: int
+        The number of rows of the table read at once.
+
+    Returns:
+    --------
+    Iterator[pd.DataFrame]
+        The non-empty chunks of matching rows.
+    """
+
+    for start in range(0, len(df), chunk_rows):
+        rows = np.flatnonzero(mask[start : start + chunk_rows]) + start
+        if len(rows) == 0:
+            continue
+
+        df_chunk = df.iloc[rows].copy()
+        df_chunk["annee"] = df_chunk["annee"].astype(int) + 2000
+        yield df_chunk
+
+
+def write_export(
+    file: BinaryIO,
+    df: pd.DataFrame,
+    mask: np.ndarray,
+    fmt: str = "csv",
+    sep: str = ";",
+    chunk_rows: int = CHUNK_ROWS,
+) -> int:
+    """
+    Writes the rows of a table matching a mask to a file, chunk by chunk,
+    so the rows are never all copied at once.
+
+    Parameters:
+    -----------
+    file: BinaryIO
+        The file to write to, opened in binary mode.
+    df: pd.DataFrame
+        The table of an ExplorerIndex.
+    mask: np.ndarray
+        The rows to export, see tools.schema.explorer_mask.
+    fmt: str
+        The format of the export, see EXPORT_FORMATS.
+    sep: str
+        The separator of the CSV formats.
+    chunk_rows: int
+        The number of rows of the table read at once.
+
+    Returns:
+    --------
+    int
+        The number of rows written.
+    """
+
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}, use one of {EXPORT_FORMATS}")
+
+    rows = 0
+    chunks = export_chunks(df, mask, chunk_rows)
+
+    if fmt == "parquet":
+        # the schema is taken from the table, so an empty export still has its columns
+        empty = df.iloc[:0].astype({"annee": int})
+        schema = pa.Schema.from_pandas(empty, preserve_index=False)
+        with pq.ParquetWriter(file, schema) as writer:
+            for df_chunk in chunks:
+                # each chunk stores the dictionary of its categorical columns
+                categorical = df_chunk.select_dtypes("category").columns
+                df_chunk[categorical] = df_chunk[categorical].apply(
+                    lambda column: column.cat.remove_unused_categories()
+                )
+                writer.write_table(
+                    pa.Table.from_pandas(df_chunk, schema, preserve_index=False)
+                )
+                rows += len(df_chunk)
+        return rows
+
+    output = gzip.GzipFile(fileobj=file, mode="wb") if fmt == "csv.gz" else file
+    try:
+        output.write(sep.join(df.columns).encode() + b"\n")
+        for df_chunk in chunks:
+            output.write(df_chunk.to_csv(sep=sep, index=False, header=False).encode())
+            rows += len(df_chunk)
+    finally:
+        if output is not file:
+            output.close()
+    return rows
+
+
+def export_slice(
+    file: BinaryIO,
+    index: ExplorerIndex,
+    years: tuple[int, ...] = (),
+    classes: tuple[str, ...] = (),
+    departments: tuple[str, ...] = (),
+    min_population: float = 0,
+    max_population: float = np.inf,
+    fmt: str = "csv",
+    sep: str = ";",
+) -> int:
+    """
+    Writes the rows of the communal dataset matching some filters to a file.
+
+    Parameters:
+    -----------
+    file: BinaryIO
+        The file to write to, opened in binary mode.
+    index: ExplorerIndex
+        The index, as returned by get_explorer_index.
+    years: tuple[int, ...]
+        The years of the rows, all the years when empty.
+    classes: tuple[str, ...]
+        The categories of crimes of the rows, all the categories when empty.
+    departments: tuple[str, ...]
+        The departments of the rows, all the departments when empty.
+    min_population: float
+        The minimum population of the city of the rows.
+    max_population: float
+        The maximum population of the city of the rows.
+    fmt: str
+        The format of the export, see EXPORT_FORMATS.
+    sep: str
+        The separator of the CSV formats.
+
+    Returns:
+    --------
+    int
+        The number of rows written.
+    """
+
+    mask = explorer_mask(
+        index.table,
+        list(years),
+        list(classes),
+        list(departments),
+        min_population,
+        max_population,
+    )
+    return write_export(file, index.table, mask, fmt, sep)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Exports the rows of the communal dataset matching some filters."
+    )
+    parser.add_argument("output", type=Path, help="file to write, - for stdout")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--years", type=int, nargs="*", default=[])
+    parser.add_argument("--classes", nargs="*", default=[])
+    parser.add_argument("--departments", nargs="*", default=[])
+    parser.add_argument("--min-population", type=float, default=0)
+    parser.add_argument("--max-population", type=float, default=np.inf)
+    parser.add_argument("--sep", default=";")
+    args = parser.parse_args()
+
+    import streamlit.logger
+
+    # the data layer is used without the app, in a session of its own
+    streamlit.logger.set_log_level("error")
+    from tools.cache import attach_script_context
+    from tools.utility import get_explorer_index
+
+    attach_script_context("export")
+    index = get_explorer_index()
+
+    def export(file: BinaryIO) -> int:
+        return export_slice(
+            file,
+            index,
+            args.years,
+            args.classes,
+            args.departments,
+            args.min_population,
+            args.max_population,
+            args.format,
+            args.sep,
+        )
+
+    if str(args.output) == "-":
+        rows = export(sys.stdout.buffer)
+    else:
+        with open(args.output, "wb") as f:
+            rows = export(f)
+    print(f"{rows:,} rows exported", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
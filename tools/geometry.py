@@ -0,0 +1,295 @@
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+from tools.config import GEOMETRY_PATH
+
+
+# zoom levels of the map with their own simplified geometry, from France to a department
+ZOOM_LEVELS = (4, 6, 8)
+
+# coordinates are stored as integers, in units of 1e-5 degree (about 1 m)
+QUANTUM = 1e-5
+
+
+def tolerance(zoom: int) -> float:
+    """
+    Returns the simplification tolerance of a zoom level: half a pixel,
+    in degrees of Web Mercator coordinates.
+    """
+
+    return 360 / (256 * 2**zoom) / 2
+
+
+def mercator(points: np.ndarray) -> np.ndarray:
+    """
+    Projects (lon, lat) points to Web Mercator, scaled like the longitudes,
+    so that a tolerance is the same number of pixels everywhere on the map.
+    """
+
+    lat = np.radians(np.clip(points[:, 1], -85, 85))
+    y = np.degrees(np.log(np.tan(np.pi / 4 + lat / 2)))
+    return np.column_stack([points[:, 0], y])
+
+
+def douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Simplifies a line with the Douglas-Peucker algorithm, without recursion.
+
+    Parameters:
+    -----------
+    points: np.ndarray
+        The (m, 2) points of the line.
+    tolerance: float
+        The maximum distance between the line and its simplification.
+
+    Returns:
+    --------
+    np.ndarray
+        The (m,) mask of the points kept, the first and last points are always kept.
+    """
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+
+    while stack:
+        start, stop = stack.pop()
+        if stop - start < 2:
+            continue
+
+        inner = points[start + 1 : stop] - points[start]
+        dx, dy = points[stop] - points[start]
+        length = np.hypot(dx, dy)
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(dx * inner[:, 1] - dy * inner[:, 0]) / length
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            farthest += start + 1
+            keep[farthest] = True
+            stack += [(start, farthest), (farthest, stop)]
+
+    return keep
+
+
+def simplify_ring(ring: np.ndarray, tolerance: float) -> np.ndarray | None:
+    """
+    Simplifies a closed ring of (lon, lat) points.
+
+    Parameters:
+    -----------
+    ring: np.ndarray
+        The (m, 2) points of the ring, closed or not.
+    tolerance: float
+        The tolerance in degrees of Web Mercator coordinates, see tolerance.
+
+    Returns:
+    --------
+    np.ndarray | None
+        The points kept, without the closing point, or None when less than 3 are left.
+    """
+
+    if len(ring) > 1 and (ring[0] == ring[-1]).all():
+        ring = ring[:-1]
+    if len(ring) < 3:
+        return None
+
+    # the ring is split at its farthest point from the first one,
+    # since both ends of a closed line are the same point
+    projected = mercator(ring)
+    farthest = int(np.argmax(np.hypot(*(projected - projected[0]).T)))
+    closed = np.vstack([projected, projected[:1]])
+
+    keep = np.zeros(len(closed), dtype=bool)
+    keep[: farthest + 1] = douglas_peucker(closed[: farthest + 1], tolerance)
+    keep[farthest:] |= douglas_peucker(closed[farthest:], tolerance)
+
+    simplified = ring[keep[:-1]]
+    return simplified if len(simplified) >= 3 else None
+
+
+def read_geojson(
+    path: Path, code_property: str = "code"
+) -> dict[str, list[list[np.ndarray]]]:
+    """
+    Reads the boundaries of the departments from a GeoJSON file.
+
+    Parameters:
+    -----------
+    path: Path
+        A GeoJSON FeatureCollection of Polygon or MultiPolygon, one per department.
+    code_property: str
+        The property of the features with the department code, e.g. "13" or "2A".
+
+    Returns:
+    --------
+    dict[str, list[list[np.ndarray]]]
+        The polygons of each department, as lists of (m, 2) rings of (lon, lat) points,
+        the first ring of a polygon being its outline and the others its holes.
+    """
+
+    with open(path, encoding="utf-8") as f:
+        features = json.load(f)["features"]
+
+    departments = {}
+    for feature in features:
+        geometry = feature["geometry"]
+        polygons = geometry["coordinates"]
+        if geometry["type"] == "Polygon":
+            polygons = [polygons]
+        code = str(feature["properties"][code_property])
+        departments.setdefault(code, []).extend(
+            [np.array(ring, dtype=np.float64)[:, :2] for ring in polygon]
+            for polygon in polygons
+        )
+    return departments
+
+
+def build_levels(
+    departments: dict[str, list[list[np.ndarray]]],
+    zoom_levels: tuple[int, ...] = ZOOM_LEVELS,
+) -> dict[str, np.ndarray]:
+    """
+    Simplifies the boundaries of the departments for each zoom level and encodes them
+    as compact arrays: quantized coordinates, delta-encoded in each ring.
+
+    Parameters:
+    -----------
+    departments: dict[str, list[list[np.ndarray]]]
+        The polygons of each department, as returned by read_geojson.
+    zoom_levels: tuple[int, ...]
+        The zoom levels to simplify the boundaries for.
+
+    Returns:
+    --------
+    dict[str, np.ndarray]
+        The arrays to save with np.savez_compressed, read by load_polygons:
+        "departments" (d,) the department codes, and for each zoom level z
+        "z{z}_points" (m, 2) int32 coordinates, the first of each ring in QUANTUM units
+        and the next ones as differences with the previous point,
+        "z{z}_rings" (r + 1,) start of each ring in the points,
+        "z{z}_polygons" (p + 1,) start of each polygon in the rings,
+        "z{z}_departments" (p,) position in departments of the department of each polygon.
+    """
+
+    codes = sorted(departments)
+    arrays = {"departments": np.array(codes)}
+
+    for zoom in zoom_levels:
+        points, rings, polygons, polygon_departments = [], [0], [0], []
+
+        for position, code in enumerate(codes):
+            kept = []
+            for polygon in departments[code]:
+                outline = simplify_ring(polygon[0], tolerance(zoom))
+                if outline is None:
+                    continue
+                holes = [simplify_ring(hole, tolerance(zoom)) for hole in polygon[1:]]
+                kept.append([outline, *[hole for hole in holes if hole is not None]])
+
+            # a department smaller than the tolerance keeps its largest outline
+            if not kept:
+                largest = max(departments[code], key=lambda polygon: len(polygon[0]))
+                kept = [[largest[0][:-1]]]
+
+            for polygon in kept:
+                for ring in polygon:
+                    # the first point is kept whole, its difference with 0
+                    quantized = np.round(ring / QUANTUM).astype(np.int32)
+                    points.append(np.diff(quantized, axis=0, prepend=0))
+                    rings.append(rings[-1] + len(ring))
+                polygons.append(polygons[-1] + len(polygon))
+                polygon_departments.append(position)
+
+        arrays[f"z{zoom}_points"] = np.concatenate(points)
+        arrays[f"z{zoom}_rings"] = np.array(rings, dtype=np.int64)
+        arrays[f"z{zoom}_polygons"] = np.array(polygons, dtype=np.int64)
+        arrays[f"z{zoom}_departments"] = np.array(polygon_departments, dtype=np.int16)
+
+    return arrays
+
+
+def load_polygons(
+    zoom: int, path: Path = GEOMETRY_PATH
+) -> list[tuple[str, list[list[list[float]]]]] | None:
+    """
+    Loads the boundaries of the departments simplified for a zoom level.
+
+    Parameters:
+    -----------
+    zoom: int
+        The zoom level, one of ZOOM_LEVELS.
+    path: Path
+        The file written by build_levels.
+
+    Returns:
+    --------
+    list[tuple[str, list[list[list[float]]]]] | None
+        The department code and the rings of [lon, lat] points of each polygon,
+        or None when the file doesn't exist.
+    """
+
+    if not Path(path).exists():
+        return None
+
+    with np.load(path) as arrays:
+        codes = arrays["departments"]
+        points = arrays[f"z{zoom}_points"].astype(np.int64)
+        rings = arrays[f"z{zoom}_rings"]
+        polygons = arrays[f"z{zoom}_polygons"]
+        departments = arrays[f"z{zoom}_departments"]
+
+    # undoes the delta encoding: a cumulative sum restarting at each ring
+    coordinates = np.cumsum(points, axis=0)
+    starts = rings[:-1]
+    offsets = np.repeat(coordinates[starts] - points[starts], np.diff(rings), axis=0)
+    coordinates = ((coordinates - offsets) * QUANTUM).round(5).tolist()
+
+    return [
+        (
+            str(codes[departments[polygon]]),
+            [
+                coordinates[rings[ring] : rings[ring + 1]]
+                for ring in range(polygons[polygon], polygons[polygon + 1])
+            ],
+        )
+        for polygon in range(len(departments))
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Simplifies the boundaries of the departments for each zoom level "
+        "of the map and stores them compactly."
+    )
+    parser.add_argument("geojson", type=Path, help="GeoJSON of the departments")
+    parser.add_argument("--output", type=Path, default=GEOMETRY_PATH)
+    parser.add_argument(
+        "--code-property",
+        default="code",
+        help="property of the features with the department code",
+    )
+    args = parser.parse_args()
+
+    departments = read_geojson(args.geojson, args.code_property)
+    arrays = build_levels(departments)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    np.savez_compressed(args.output, **arrays)
+
+    source = sum(
+        len(ring) for code in departments for p in departments[code] for ring in p
+    )
+    print(f"{len(departments)} departments, {source:,} points")
+    for zoom in ZOOM_LEVELS:
+        print(f"zoom {zoom}: {len(arrays[f'z{zoom}_points']):,} points")
+    print(f"Written to {args.output} ({args.output.stat().st_size / 1e3:,.0f} kB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+import gzip
+import io
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from tools.config import PARSE_WORKERS
+
+
+# fixed schema of the communal dataset, so that every chunk gets the same dtypes
+# text columns are categorical: they are cheap to send back from the workers
+MAIN_DTYPES = {
+    "CODGEO_2023": "category",
+    "annee": "int8",
+    "classe": "category",
+    "unité.de.compte": "category",
+    "valeur.publiée": "category",
+    "faits": "float64",
+    "tauxpourmille": "category",
+    "complementinfoval": "category",
+    "complementinfotaux": "category",
+    "POP": "float64",
+    "millPOP": "float64",
+    "LOG": "float64",
+    "millLOG": "float64",
+}
+
+# number of rows parsed at once by read_csv_chunked
+STREAM_CHUNK_ROWS = 200_000
+
+# bytes of compressed input decompressed at once by decompress_to_shared
+DECOMPRESS_CHUNK = 1 << 20
+
+# bytes searched at once for the end of a line
+FIND_WINDOW = 1 << 16
+
+
+def find_newline(data: bytes | memoryview, start: int) -> int:
+    """
+    Returns the offset of the first newline of data at or after start, or -1.
+    Works on memoryviews too, which have no find, by searching small windows.
+    """
+
+    if isinstance(data, bytes):
+        return data.find(b"\n", start)
+
+    while start < len(data):
+        found = bytes(data[start : start + FIND_WINDOW]).find(b"\n")
+        if found != -1:
+            return start + found
+        start += FIND_WINDOW
+    return -1
+
+
+def decompress_to_shared(content: bytes) -> tuple[SharedMemory, int]:
+    """
+    Decompresses gzipped content straight into a new shared memory block, without
+    holding the decompressed file anywhere else.
+
+    Parameters:
+    -----------
+    content: bytes
+        The gzipped content, possibly of several gzip members.
+
+    Returns:
+    --------
+    tuple[SharedMemory, int]
+        The block, to close and unlink, and the size of the decompressed data in it.
+    """
+
+    # the trailer holds the size of the last member modulo 4 GB: the block is grown
+    # when it is wrong (several members, or a file over 4 GB)
+    size = int.from_bytes(content[-4:], "little") if len(content) >= 4 else 0
+    shared = SharedMemory(create=True, size=max(size, 1))
+    length = 0
+
+    def write(output: bytes) -> None:
+        nonlocal shared, length
+        if length + len(output) > shared.size:
+            grown = SharedMemory(
+                create=True, size=max(2 * shared.size, length + len(output))
+            )
+            grown.buf[:length] = shared.buf[:length]
+            shared.close()
+            shared.unlink()
+            shared = grown
+        shared.buf[length : length + len(output)] = output
+        length += len(output)
+
+    try:
+        view = memoryview(content)
+        position = 0
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        while position < len(content):
+            piece = view[position : position + DECOMPRESS_CHUNK]
+            position += len(piece)
+            write(decompressor.decompress(piece))
+            if decompressor.eof:
+                position -= len(decompressor.unused_data)
+                # the next member, unless the rest is the zero padding gzip allows
+                if view[position : position + 1] == b"\x00":
+                    break
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        write(decompressor.flush())
+    except BaseException:
+        shared.close()
+        shared.unlink()
+        raise
+
+    return shared, length
+
+
+def split_line_ranges(
+    data: bytes | memoryview, start: int, chunks: int
+) -> list[tuple[int, int]]:
+    """
+    Splits a buffer into byte ranges that all end on a line boundary.
+
+    Parameters:
+    -----------
+    data: bytes | memoryview
+        The buffer to split.
+    start: int
+        The offset of the first byte to split (usually the end of the header).
+    chunks: int
+        The number of ranges wanted. Fewer are returned for small buffers.
+
+    Returns:
+    --------
+    list[tuple[int, int]]
+        A list of (start, stop) offsets covering data[start:].
+    """
+
+    size = len(data)
+    step = max((size - start) // max(chunks, 1), 1)
+
+    ranges = []
+    while start < size:
+        stop = find_newline(data, min(start + step, size - 1))
+        stop = size if stop == -1 else stop + 1
+        ranges.append((start, stop))
+        start = stop
+
+    return ranges
+
+
+def _parse_range(
+    start: int,
+    stop: int,
+    columns: list[str],
+    sep: str,
+    dtype: dict,
+    usecols: list[str] | None,
+    where: dict[str, tuple] | None,
+    data: bytes | memoryview | None = None,
+    shared_name: str | None = None,
+) -> pd.DataFrame:
+    """
+    Parses one byte range of the decompressed CSV, read from data or from the shared
+    memory block named shared_name. Runs in a worker process.
+    Only the range is copied, to give pandas a file of its own.
+    """
+
+    if shared_name is None:
+        content = data[start:stop]
+    else:
+        shared = SharedMemory(shared_name)
+        try:
+            content = bytes(shared.buf[start:stop])
+        finally:
+            shared.close()
+
+    df = pd.read_csv(
+        io.BytesIO(content),
+        sep=sep,
+        header=None,
+        names=columns,
+        dtype=dtype,
+        usecols=usecols,
+    )
+
+    # rows are filtered before leaving the worker, so they are never concatenated
+    for col, (low, high) in (where or {}).items():
+        df = df[df[col].between(low, high)]
+
+    return df.reset_index(drop=True)
+
+
+def concat_chunks(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenates parsed chunks column by column.
+    Categorical columns are merged with union_categoricals, so that they stay
+    categorical even when the chunks don't share the same categories.
+
+    Parameters:
+    -----------
+    frames: list[pd.DataFrame]
+        The chunks to concatenate, all with the same columns.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame containing all the rows of the chunks.
+    """
+
+    if len(frames) == 1:
+        return frames[0]
+
+    columns = {}
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            columns[col] = union_categoricals([frame[col] for frame in frames])
+        else:
+            columns[col] = np.concatenate([frame[col].to_numpy() for frame in frames])
+
+    return pd.DataFrame(columns, copy=False)
+
+
+def read_csv_parallel(
+    content: bytes,
+    sep: str = ";",
+    dtype: dict | None = None,
+    compression: str | None = "gzip",
+    workers: int | None = None,
+    usecols: list[str] | None = None,
+    where: dict[str, tuple] | None = None,
+) -> pd.DataFrame:
+    """
+    Reads a CSV file using several processes.
+    The file is decompressed once, straight into the shared memory the workers read,
+    split at line boundaries into byte ranges, and each range is parsed in a process
+    pool with the same fixed schema.
+
+    Parameters:
+    -----------
+    content: bytes
+        The raw (possibly compressed) content of the CSV file.
+    sep: str
+        The field separator.
+    dtype: dict | None
+        The dtype of each column. Columns missing from the file are ignored.
+    compression: str | None
+        "gzip" if the content is gzipped, None otherwise.
+    workers: int | None
+        The number of processes to use. Defaults to PARSE_WORKERS.
+    usecols: list[str] | None
+        The columns to keep. Columns missing from the file are ignored.
+    where: dict[str, tuple] | None
+        Inclusive (low, high) bounds per column; rows outside are dropped while parsing.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame containing the parsed file.
+    """
+
+    workers = workers or PARSE_WORKERS
+    shared = None
+    if compression == "gzip" and workers > 1:
+        # the workers read the file from shared memory, so it is decompressed there
+        shared, size = decompress_to_shared(content)
+        data = shared.buf[:size]
+    elif compression == "gzip":
+        data = gzip.decompress(content)
+    else:
+        data = content
+
+    try:
+        # the header is parsed once, the chunks are then parsed without it
+        header_end = find_newline(data, 0) + 1 or len(data)
+        columns = pd.read_csv(
+            io.BytesIO(data[:header_end]), sep=sep, nrows=0
+        ).columns.tolist()
+        dtype = {col: t for col, t in (dtype or {}).items() if col in columns}
+        if usecols is not None:
+            usecols = [col for col in columns if col in usecols]
+
+        ranges = split_line_ranges(data, header_end, workers)
+        if not ranges:
+            return pd.DataFrame(
+                {col: pd.Series(dtype=dtype.get(col)) for col in usecols or columns}
+            )
+
+        if workers == 1 or len(ranges) == 1:
+            frames = [
+                _parse_range(start, stop, columns, sep, dtype, usecols, where, data)
+                for start, stop in ranges
+            ]
+        else:
+            if shared is None:
+                shared = SharedMemory(create=True, size=len(data))
+                shared.buf[: len(data)] = data
+            # the workers aren't forked: forking the multithreaded app server could
+            # copy a lock held by another thread, so they read from shared memory
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                "forkserver" if "forkserver" in methods else "spawn"
+            )
+            with ProcessPoolExecutor(workers, mp_context=context) as pool:
+                futures = [
+                    pool.submit(
+                        _parse_range,
+                        start,
+                        stop,
+                        columns,
+                        sep,
+                        dtype,
+                        usecols,
+                        where,
+                        shared_name=shared.name,
+                    )
+                    for start, stop in ranges
+                ]
+                frames = [future.result() for future in futures]
+    finally:
+        if shared is not None:
+            # the block can't be closed while a view of it is alive
+            if isinstance(data, memoryview):
+                data.release()
+            shared.close()
+            shared.unlink()
+
+    return concat_chunks(frames)
+
+
+def read_csv_chunked(
+    path: Path,
+    sep: str = ";",
+    dtype: dict | None = None,
+    usecols: list[str] | None = None,
+    where: dict[str, tuple] | None = None,
+    chunk_rows: int = STREAM_CHUNK_ROWS,
+) -> pd.DataFrame:
+    """
+    Reads a gzipped CSV file by chunks in the current process, filtering each chunk
+    before keeping it. Unlike read_csv_parallel, the file is never decompressed
+    nor parsed whole, so the memory used is about the size of the result.
+
+    Parameters:
+    -----------
+    path: Path
+        The path of the gzipped CSV file.
+    sep: str
+        The field separator.
+    dtype: dict | None
+        The dtype of each column. Columns missing from the file are ignored.
+    usecols: list[str] | None
+        The columns to keep. Columns missing from the file are ignored.
+    where: dict[str, tuple] | None
+        Inclusive (low, high) bounds per column; rows outside are dropped.
+    chunk_rows: int
+        The number of rows parsed at once.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame containing the rows kept.
+    """
+
+    with gzip.open(path) as f:
+        columns = pd.read_csv(f, sep=sep, nrows=0).columns.tolist()
+    dtype = {col: t for col, t in (dtype or {}).items() if col in columns}
+    if usecols is not None:
+        usecols = [col for col in columns if col in usecols]
+
+    frames = []
+    with gzip.open(path) as f:
+        for df in pd.read_csv(
+            f, sep=sep, dtype=dtype, usecols=usecols, chunksize=chunk_rows
+        ):
+            for col, (low, high) in (where or {}).items():
+                df = df[df[col].between(low, high)]
+            frames.append(df.reset_index(drop=True))
+
+    if not frames:
+        return pd.DataFrame(
+            {col: pd.Series(dtype=dtype.get(col)) for col in usecols or columns}
+        )
+    # chunks without rows left are only kept for their dtypes
+    return concat_chunks([df for df in frames if len(df)] or frames[:1])
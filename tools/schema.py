@@ -0,0 +1,386 @@
+from typing import Callable, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+
+# columns that only depend on the place and the year, repeated on every "classe" row
+POPULATION_COLUMNS = ["POP", "millPOP", "LOG", "millLOG"]
+
+# columns of the complementary dataset describing a commune
+COMMUNE_COLUMNS = ["CODGEO", "LIBGEO", "DEP", "city_dep"]
+
+# supra-communal zones of the complementary dataset, with their names on the pages
+ZONE_COLUMNS = {
+    "EPCI": "Intercommunality",
+    "ARR": "Arrondissement",
+    "ZE2020": "Employment zone",
+    "UU2020": "Urban unit",
+    "BV2022": "Living area",
+    "AAV2020": "Attraction area",
+}
+
+
+# columns of the communal dataset needed by each query helper, see requires_columns
+COLUMN_REQUIREMENTS: dict[str, tuple[str, ...]] = {}
+
+
+def requires_columns(*columns: str) -> Callable:
+    """
+    Declares the columns of the communal dataset a query helper needs.
+    In low-memory mode, only the columns declared by the helpers are loaded.
+
+    Parameters:
+    -----------
+    *columns: str
+        The names of the columns, as in the CSV file.
+
+    Returns:
+    --------
+    Callable
+        A decorator registering the columns and returning the helper unchanged.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        COLUMN_REQUIREMENTS[func.__name__] = columns
+        return func
+
+    return decorator
+
+
+def required_columns(*helpers: str) -> list[str]:
+    """
+    Returns the columns of the communal dataset needed by some query helpers.
+
+    Parameters:
+    -----------
+    *helpers: str
+        The names of the helpers. Defaults to every helper that declared columns.
+
+    Returns:
+    --------
+    list[str]
+        The union of the columns declared by the helpers.
+    """
+
+    requirements = [COLUMN_REQUIREMENTS[helper] for helper in helpers] or list(
+        COLUMN_REQUIREMENTS.values()
+    )
+    return sorted({col for columns in requirements for col in columns})
+
+
+class StarSchema(NamedTuple):
+    """
+    The communal dataset split into a fact table and its dimensions.
+
+    facts: one row per (CODGEO, annee, classe) with the number of crimes "faits",
+        sorted by CODGEO so that the rows of a commune are contiguous (see commune_rows)
+    commune_year: one row per (CODGEO, annee) with the population columns
+    communes: one row per commune with its name and department
+    """
+
+    facts: pd.DataFrame
+    commune_year: pd.DataFrame
+    communes: pd.DataFrame
+
+
+def split_population(
+    df: pd.DataFrame, keys: list[str]
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Moves the population columns out of a crime dataset.
+
+    Parameters:
+    -----------
+    df: pd.DataFrame
+        A crime dataset with one row per place, year and "classe".
+    keys: list[str]
+        The columns identifying a place and a year, e.g. ["CODGEO", "annee"].
+
+    Returns:
+    --------
+    tuple[pd.DataFrame, pd.DataFrame]
+        The dataset without the population columns,
+        and a DataFrame with one row per keys containing the population columns.
+    """
+
+    columns = [col for col in POPULATION_COLUMNS if col in df.columns]
+
+    # the population is the same on every "classe" row, we keep the first known value
+    df_population = df.groupby(keys, observed=True)[columns].first().reset_index()
+    df_facts = df.drop(columns=columns)
+
+    return df_facts, df_population
+
+
+def build_star_schema(df: pd.DataFrame, df_comp: pd.DataFrame) -> StarSchema:
+    """
+    Splits the communal dataset into a compact fact table and its dimensions.
+
+    Parameters:
+    -----------
+    df: pd.DataFrame
+        The communal dataset, as returned by download_app_dataset.
+    df_comp: pd.DataFrame
+        The complementary dataset, as returned by load_comp_dataset.
+
+    Returns:
+    --------
+    StarSchema
+        The fact table, the commune-year population and the commune attributes.
+    """
+
+    df = df.rename(columns={"CODGEO_2023": "CODGEO"})
+    df["CODGEO"] = df["CODGEO"].astype("category")
+    df["CODGEO"] = df["CODGEO"].cat.reorder_categories(
+        sorted(df["CODGEO"].cat.categories)
+    )
+    df["classe"] = df["classe"].astype("category")
+
+    df_facts, df_commune_year = split_population(df, ["CODGEO", "annee"])
+    df_facts = df_facts[["CODGEO", "annee", "classe", "faits"]]
+    df_facts = df_facts.sort_values(["CODGEO", "annee", "classe"], kind="stable")
+    df_facts = df_facts.reset_index(drop=True)
+
+    df_communes = df_comp[COMMUNE_COLUMNS].reset_index(drop=True)
+
+    return StarSchema(df_facts, df_commune_year, df_communes)
+
+
+def commune_rows(df: pd.DataFrame, codes: list[str]) -> np.ndarray:
+    """
+    Returns the positions of the rows of some communes in a table sorted by CODGEO,
+    like the facts and commune_year tables of the star schema.
+    Each commune is found by binary search, without scanning the table.
+
+    Parameters:
+    -----------
+    df: pd.DataFrame
+        A table with a categorical CODGEO column, sorted by CODGEO.
+    codes: list[str]
+        The CODGEO of the communes.
+
+    Returns:
+    --------
+    np.ndarray
+        The positions of the rows of the communes, in the order of codes.
+    """
+
+    categories = df["CODGEO"].cat.categories
+    positions = categories.get_indexer(codes)
+    positions = positions[positions >= 0]
+
+    table_codes = df["CODGEO"].cat.codes.to_numpy()
+    starts = np.searchsorted(table_codes, positions, side="left")
+    stops = np.searchsorted(table_codes, positions, side="right")
+
+    if len(starts) == 0:
+        return np.array([], dtype=np.int64)
+    return np.concatenate(
+        [np.arange(start, stop) for start, stop in zip(starts, stops)]
+    )
+
+
+def fill_missing_population(df_population: pd.DataFrame) -> pd.DataFrame:
+    """
+    Uses the 2020 population for 2021 and 2022, which the dataset doesn't provide.
+
+    Parameters:
+    -----------
+    df_population: pd.DataFrame
+        Rows of the commune_year table of the star schema.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A copy of the table with the population of 2021 and 2022 filled.
+    """
+
+    df_population = df_population.copy()
+
+    population_2020 = df_population[df_population["annee"] == 20]
+    population_2020 = population_2020.set_index("CODGEO")["POP"]
+    late = df_population["annee"] > 20
+    df_population.loc[late, "POP"] = (
+        df_population.loc[late, "CODGEO"].map(population_2020).astype(float)
+    )
+
+    return df_population
+
+
+# columns of the explorer table that can be sorted on, see build_explorer_index
+EXPLORER_SORT_COLUMNS = ["CODGEO", "faits", "POP", "faits_per_1000"]
+
+
+class ExplorerIndex(NamedTuple):
+    """
+    The fact table with the city, population and department of each row, and its sort orders.
+
+    table: one row per (CODGEO, annee, classe), sorted by CODGEO, annee and classe
+    orders: for each column of EXPLORER_SORT_COLUMNS, the positions of the rows
+        in ascending order with NaN last, and the number of rows that aren't NaN
+    """
+
+    table: pd.DataFrame
+    orders: dict[str, tuple[np.ndarray, int]]
+
+
+def build_explorer_index(star: StarSchema) -> ExplorerIndex:
+    """
+    Joins the fact table with its dimensions and sorts it once on every sortable column.
+
+    Parameters:
+    -----------
+    star: StarSchema
+        The star schema, as returned by load_star_schema.
+
+    Returns:
+    --------
+    ExplorerIndex
+        The joined table and its sort orders, see explore.
+    """
+
+    df_population = fill_missing_population(star.commune_year)
+    df = star.facts.merge(
+        df_population[["CODGEO", "annee", "POP"]], on=["CODGEO", "annee"], how="left"
+    )
+
+    # the names and departments are categorical, so they cost a few bytes per row
+    df_communes = star.communes.drop_duplicates("CODGEO").set_index("CODGEO")
+    df.insert(1, "LIBGEO", df["CODGEO"].map(df_communes["LIBGEO"]).astype("category"))
+    df["DEP"] = df["CODGEO"].map(df_communes["DEP"]).astype("category")
+    df["DEP"] = df["DEP"].cat.reorder_categories(sorted(df["DEP"].cat.categories))
+
+    population = df["POP"].where(df["POP"] > 0)
+    df["faits_per_1000"] = (df["faits"] / population * 1000).round(2)
+
+    orders = {}
+    for column in EXPLORER_SORT_COLUMNS:
+        if column == "CODGEO":
+            values = df[column].cat.codes.to_numpy()
+        else:
+            values = df[column].to_numpy()
+        # argsort puts NaN last, int32 halves the memory of the orders
+        order = np.argsort(values, kind="stable").astype(np.int32)
+        orders[column] = (order, int(np.count_nonzero(~pd.isna(values))))
+
+    return ExplorerIndex(df, orders)
+
+
+def explorer_mask(
+    df: pd.DataFrame,
+    years: list[int],
+    classes: list[str],
+    departments: list[str],
+    min_population: float,
+    max_population: float,
+) -> np.ndarray:
+    """
+    Returns the rows of the explorer table matching some filters.
+
+    Parameters:
+    -----------
+    df: pd.DataFrame
+        The table of an ExplorerIndex.
+    years: list[int]
+        The years of the rows, e.g. 2016, all the years when empty.
+    classes: list[str]
+        The categories of crimes of the rows, all the categories when empty.
+    departments: list[str]
+        The departments of the rows, all the departments when empty.
+    min_population: float
+        The minimum population of the city of the rows.
+    max_population: float
+        The maximum population of the city of the rows.
+
+    Returns:
+    --------
+    np.ndarray
+        A boolean mask of the rows.
+    """
+
+    mask = np.ones(len(df), dtype=bool)
+
+    # rows without population are only left out when filtering on it
+    if min_population > 0 or max_population < np.inf:
+        mask &= df["POP"].between(min_population, max_population).to_numpy()
+
+    if years:
+        mask &= np.isin(df["annee"].to_numpy(), np.asarray(years) - 2000)
+
+    for column, values in (("classe", classes), ("DEP", departments)):
+        if values:
+            # lookup table of the allowed categories, the last item stands for NaN (-1)
+            categories = df[column].cat.categories
+            allowed = np.zeros(len(categories) + 1, dtype=bool)
+            positions = categories.get_indexer(values)
+            allowed[positions[positions >= 0]] = True
+            mask &= allowed[df[column].cat.codes.to_numpy()]
+
+    return mask
+
+
+def explore(
+    index: ExplorerIndex,
+    years: list[int],
+    classes: list[str],
+    departments: list[str],
+    min_population: float,
+    max_population: float,
+    sort_by: str,
+    ascending: bool,
+    page: int,
+    page_size: int,
+) -> tuple[pd.DataFrame, int]:
+    """
+    Returns a page of the rows of the explorer table matching some filters.
+    The filters are applied as boolean masks and the rows are taken in a precomputed
+    sort order, so only the rows of the page are copied.
+
+    Parameters:
+    -----------
+    index: ExplorerIndex
+        The index, as returned by build_explorer_index.
+    years: list[int]
+        The years of the rows, e.g. 2016, all the years when empty.
+    classes: list[str]
+        The categories of crimes of the rows, all the categories when empty.
+    departments: list[str]
+        The departments of the rows, all the departments when empty.
+    min_population: float
+        The minimum population of the city of the rows.
+    max_population: float
+        The maximum population of the city of the rows.
+    sort_by: str
+        The column to sort the rows on, see EXPLORER_SORT_COLUMNS.
+    ascending: bool
+        Whether to sort in ascending order. NaN are always last.
+    page: int
+        The position of the page, from 0. The last page is returned when it is too large.
+    page_size: int
+        The number of rows per page.
+
+    Returns:
+    --------
+    tuple[pd.DataFrame, int]
+        The rows of the page and the number of rows matching the filters.
+    """
+
+    df = index.table
+    mask = explorer_mask(
+        df, years, classes, departments, min_population, max_population
+    )
+
+    order, known = index.orders[sort_by]
+    rows_known = order[:known][mask[order[:known]]]
+    rows_missing = order[known:][mask[order[known:]]]
+    if not ascending:
+        rows_known = rows_known[::-1]
+    rows = np.concatenate([rows_known, rows_missing])
+
+    total = len(rows)
+    page = min(page, max(total - 1, 0) // page_size)
+    df_page = df.iloc[rows[page * page_size : (page + 1) * page_size]].copy()
+    df_page["annee"] = df_page["annee"].astype(int) + 2000
+
+    return df_page, total
@@ -0,0 +1,138 @@
+import hashlib
+import threading
+from pathlib import Path
+
+import requests
+
+from tools.config import CACHE_DIR, SOURCE_DIR
+from tools.download import RETRIES, DownloadError, download, file_hash, make_session
+
+
+SOURCES = {
+    # municipal statistical database (gzipped CSV)
+    "main": "https://www.data.gouv.fr/fr/datasets/r/3f51212c-f7d2-4aec-b899-06be6cdd1030",
+    # departmental statistical database (gzipped CSV)
+    "dep": "https://www.data.gouv.fr/fr/datasets/r/acc332f6-92be-42af-9721-f3609bea8cfc",
+    # complementary file with the cities and their zones (Excel)
+    "comp": "https://www.data.gouv.fr/fr/datasets/r/16ec626b-1a15-4512-a8ca-774921fc969e",
+}
+
+# data.gouv.fr API describing a resource, including its size and checksum
+RESOURCE_API = "https://www.data.gouv.fr/api/2/datasets/resources/{}/"
+
+# sha256 of each source fetched by this process
+_digests: dict[str, str] = {}
+_locks = {name: threading.Lock() for name in SOURCES}
+_session = make_session()
+
+
+def get_resource_checksum(name: str) -> tuple[str, str] | None:
+    """
+    Returns the checksum data.gouv.fr publishes for a source, if any.
+
+    Parameters:
+    -----------
+    name: str
+        The name of the source, one of SOURCES.
+
+    Returns:
+    --------
+    tuple[str, str] | None
+        The (algorithm, hex digest) of the file, or None if it isn't available.
+    """
+
+    resource_id = SOURCES[name].rstrip("/").rsplit("/", 1)[-1]
+    try:
+        response = _session.get(RESOURCE_API.format(resource_id), timeout=10)
+        response.raise_for_status()
+        resource = response.json().get("resource", {})
+        checksum = resource.get("checksum") or {}
+        if checksum.get("type") and checksum.get("value"):
+            return checksum["type"], checksum["value"]
+    except (requests.RequestException, ValueError, AttributeError):
+        pass
+
+    # without checksum, the file is still checked against the size sent by the server
+    return None
+
+
+def fetch_source(name: str) -> Path:
+    """
+    Downloads a source file once per process and stores it on disk.
+    Interrupted downloads are resumed, and the file is checked against its size
+    and published checksum before being used (see tools.download.download).
+    When the source can't be checked for an update, the last downloaded copy is used.
+    When SOURCE_DIR is set, the local copy of the source is used instead.
+
+    Parameters:
+    -----------
+    name: str
+        The name of the source, one of SOURCES.
+
+    Returns:
+    --------
+    Path
+        The path of the downloaded file.
+    """
+
+    if SOURCE_DIR:
+        path = Path(SOURCE_DIR) / name
+        with _locks[name]:
+            if name not in _digests:
+                _digests[name] = hashlib.sha256(path.read_bytes()).hexdigest()
+        return path
+
+    path = CACHE_DIR / "sources" / name
+
+    with _locks[name]:
+        if name not in _digests:
+            # with a verified copy, checking for an update is only tried once,
+            # and the copy is used as is when data.gouv.fr can't be reached
+            has_copy = path.exists()
+            try:
+                _digests[name] = download(
+                    SOURCES[name],
+                    path,
+                    session=_session,
+                    expected_hash=get_resource_checksum(name),
+                    retries=0 if has_copy else RETRIES,
+                )
+            except (DownloadError, requests.RequestException):
+                if not has_copy:
+                    raise
+                _digests[name] = file_hash(path)
+
+    return path
+
+
+def source_digest(name: str) -> str:
+    """
+    Returns the sha256 of a source file, downloading it if needed.
+
+    Parameters:
+    -----------
+    name: str
+        The name of the source, one of SOURCES.
+
+    Returns:
+    --------
+    str
+        The hex digest of the file content.
+    """
+
+    fetch_source(name)
+    return _digests[name]
+
+
+def dataset_version() -> str:
+    """
+    Returns a version of the data that changes whenever any source file changes.
+
+    Returns:
+    --------
+    str
+        A hex digest combining the digests of all the sources.
+    """
+
+    digests = [source_digest(name) for name in sorted(SOURCES)]
+    return hashlib.sha256(" ".join(digests).encode()).hexdigest()[:16]
@@ -1,37 +1,113 @@
 import streamlit as st
 import pandas as pd
-import requests
-import io
 import time
 import base64
-
-
-@st.cache_data
-def load_main_dataset() -> pd.DataFrame:
+import tempfile
+import numpy as np
+from tools.analytics import (
+    CrimeCube,
+    DepartmentIndex,
+    PercentileIndex,
+    ProfileIndex,
+    Trends,
+    ZoneMembership,
+    build_crime_cube,
+    build_department_index,
+    build_percentile_index,
+    build_profile_index,
+    build_zone_membership,
+    department_communes,
+    fit_trends,
+    nearest_profiles,
+    per_capita_rates,
+    percentile_ranks,
+    year_position,
+    yoy_anomalies,
+    zone_rollup,
+)
+from tools.cache import persistent_cache
+from tools.export import export_slice
+from tools.parsing import MAIN_DTYPES, read_csv_chunked, read_csv_parallel
+from tools.config import LOW_MEMORY, YEARS
+from tools.schema import (
+    ExplorerIndex,
+    StarSchema,
+    build_explorer_index,
+    build_star_schema,
+    commune_rows,
+    explore,
+    fill_missing_population,
+    required_columns,
+    requires_columns,
+    split_population,
+)
+from tools.sources import fetch_source
+
+
+def download_main_dataset(
+    columns: list[str] | None = None, years: tuple[int, int] | None = None
+) -> pd.DataFrame:
     """
-    Loads the main dataset of crimes in France from the data.gouv.fr website.
-    To do so, it downloads the dataset from the website, and then reads it with pandas.
+    Downloads the main dataset of crimes in France from the data.gouv.fr website.
+    To do so, it downloads the dataset from the website, and then parses it on all cores,
+    or by chunks in low-memory mode.
+    The result is not cached, the app works on load_star_schema.
+
+    Parameters:
+    -----------
+    columns: list[str] | None
+        The columns to read. Defaults to all of them.
+    years: tuple[int, int] | None
+        The first and last years to read. Defaults to all of them.
 
     Returns:
     --------
     pd.DataFrame
-        A pandas DataFrame containing the loaded dataset.
+        A pandas DataFrame containing the downloaded dataset.
     """
 
-    main_dataset_path = (
-        "https://www.data.gouv.fr/fr/datasets/r/3f51212c-f7d2-4aec-b899-06be6cdd1030"
-    )
-    response = requests.get(main_dataset_path)
-    content = response.content
-    df = pd.read_csv(
-        io.BytesIO(content),
+    # the years are filtered while parsing, the other years are never stored
+    where = {"annee": (years[0] % 100, years[1] % 100)} if years else None
+
+    if LOW_MEMORY:
+        # streamed in this process: the whole file is never decompressed nor parsed
+        return read_csv_chunked(
+            fetch_source("main"),
+            sep=";",
+            dtype=MAIN_DTYPES,
+            usecols=columns,
+            where=where,
+        )
+
+    content = fetch_source("main").read_bytes()
+    df = read_csv_parallel(
+        content,
         sep=";",
+        dtype=MAIN_DTYPES,
         compression="gzip",
-        low_memory=False,
+        usecols=columns,
+        where=where,
     )
     return df
 
 
+def download_app_dataset() -> pd.DataFrame:
+    """
+    Downloads the main dataset as needed by the app.
+    In low-memory mode, only the columns declared by the query helpers and
+    the configured years are read.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame containing the downloaded dataset.
+    """
+
+    if LOW_MEMORY:
+        return download_main_dataset(required_columns(), YEARS)
+    return download_main_dataset()
+
+
 @st.cache_data
 def load_dep_dataset() -> pd.DataFrame:
     """
@@ -44,13 +120,8 @@ def load_dep_dataset() -> pd.DataFrame:
         A pandas DataFrame containing the loaded dataset.
     """
 
-    dep_dataset_path = (
-        "https://www.data.gouv.fr/fr/datasets/r/acc332f6-92be-42af-9721-f3609bea8cfc"
-    )
-    response = requests.get(dep_dataset_path)
-    content = response.content
     df_dep = pd.read_csv(
-        io.BytesIO(content),
+        fetch_source("dep"),
         sep=";",
         compression="gzip",
         low_memory=False,
@@ -70,18 +141,50 @@ def load_comp_dataset() -> pd.DataFrame:
         A pandas DataFrame containing the loaded dataset.
     """
 
-    comp_dataset_path = (
-        "https://www.data.gouv.fr/fr/datasets/r/16ec626b-1a15-4512-a8ca-774921fc969e"
-    )
-    response = requests.get(comp_dataset_path)
-    content = response.content
-    df_comp = pd.read_excel(io.BytesIO(content), sheet_name="zonages supracommunaux")
+    df_comp = pd.read_excel(fetch_source("comp"), sheet_name="zonages supracommunaux")
 
     # add a column with the city name and department code to be able to filter
     df_comp["city_dep"] = df_comp["LIBGEO"] + " (" + df_comp["DEP"] + ")"
     return df_comp
 
 
+@st.cache_resource
+@persistent_cache
+def load_star_schema() -> StarSchema:
+    """
+    Loads the main dataset split into a fact table and its dimensions.
+    The population is stored once per commune and year instead of once per "classe".
+    The tables are shared by all the sessions without being copied: don't modify them.
+
+    Returns:
+    --------
+    StarSchema
+        The fact table (CODGEO, annee, classe, faits), the population per commune
+        and year, and the commune attributes from the complementary dataset.
+    """
+
+    return build_star_schema(download_app_dataset(), load_comp_dataset())
+
+
+def get_code_geo(city: str) -> str:
+    """
+    Returns the code of a city.
+
+    Parameters:
+    -----------
+    city: str
+        The city, as "LIBGEO (DEP)".
+
+    Returns:
+    --------
+    str
+        The CODGEO of the city.
+    """
+
+    df_communes = load_star_schema().communes
+    return df_communes[df_communes["city_dep"] == city]["CODGEO"].values[0]
+
+
 def load_all_datasets() -> None:
     """
     Loads all the datasets used in the app.
@@ -91,7 +194,7 @@ def load_all_datasets() -> None:
     init_time = time.time()
 
     try:
-        load_main_dataset()
+        load_star_schema()
         load_dep_dataset()
         load_comp_dataset()
 
@@ -109,6 +212,7 @@ def load_all_datasets() -> None:
 
 
 @st.cache_data
+@persistent_cache
 def get_crimes_per_year() -> pd.DataFrame:
     """
     Returns the number of crimes per year.
@@ -118,21 +222,15 @@ def get_crimes_per_year() -> pd.DataFrame:
     pd.DataFrame
         A pandas DataFrame containing the number of crimes per year, the population per year and the number of crimes per 1000 inhabitants.
     """
-    df = load_dep_dataset()
-
-    df_year = pd.DataFrame()
-
-    df_year["annee"] = df["annee"].unique() + 2000
+    df_facts, df_population = split_population(
+        load_dep_dataset(), ["Code.département", "annee"]
+    )
 
-    df_year["faits"] = df.groupby("annee")["faits"].sum().values
+    df_year = df_facts.groupby("annee")["faits"].sum().reset_index()
+    df_year["annee"] = df_year["annee"].astype(int) + 2000
 
-    # get the population per year (we take the population of the first crime type we find)
-    df_year["population"] = (
-        df[df["classe"] == "Coups et blessures volontaires"]
-        .groupby("annee")["POP"]
-        .sum()
-        .values
-    )
+    # the population is stored once per department and year
+    df_year["population"] = df_population.groupby("annee")["POP"].sum().values
 
     # since the dataset doesn't provide the population for 2021 and 2022, we use the INSEE estimation
     # https://www.insee.fr/fr/statistiques/6686993?sommaire=6686521
@@ -159,6 +257,7 @@ def get_crimes_per_year() -> pd.DataFrame:
 
 
 @st.cache_data
+@persistent_cache
 def get_crimes_per_year_by_category(year: int) -> pd.DataFrame:
     """
     Returns the number of crimes per year by category.
@@ -184,6 +283,7 @@ def get_crimes_per_year_by_category(year: int) -> pd.DataFrame:
 
 
 @st.cache_data
+@requires_columns("CODGEO_2023", "annee", "classe", "faits", "POP")
 def get_crimes_per_category_by_city(city: str) -> pd.DataFrame:
     """
     Returns the number of crimes per year by category for a given city.
@@ -198,16 +298,17 @@ def get_crimes_per_category_by_city(city: str) -> pd.DataFrame:
     pd.DataFrame
         A pandas DataFrame containing the number of crimes per year by category for a given city.
     """
-    df = load_main_dataset()
-    df_comp = load_comp_dataset()
+    star = load_star_schema()
+    code_geo = get_code_geo(city)
 
-    code_geo = df_comp[df_comp["city_dep"] == city]["CODGEO"].values[0]
-    df_city = df[df["CODGEO_2023"] == code_geo]
+    df_city = star.facts.iloc[commune_rows(star.facts, [code_geo])]
+    df_city = df_city.merge(star.commune_year, on=["CODGEO", "annee"], how="left")
 
     return df_city
 
 
 @st.cache_data
+@requires_columns("CODGEO_2023", "annee", "classe", "faits", "POP")
 def get_crimes_per_year_by_city(city: str) -> pd.DataFrame:
     """
     Returns the number of crimes per year by city.
@@ -222,21 +323,17 @@ def get_crimes_per_year_by_city(city: str) -> pd.DataFrame:
     pd.DataFrame
         A pandas DataFrame containing the number of crimes per year by city.
     """
+    star = load_star_schema()
+    code_geo = get_code_geo(city)
     df_city = get_crimes_per_category_by_city(city)
 
-    df_year = pd.DataFrame()
-
-    df_year["annee"] = df_city["annee"].unique() + 2000
+    df_year = df_city.groupby("annee")["faits"].sum().reset_index()
 
-    df_year["faits"] = df_city.groupby("annee")["faits"].sum().values
-
-    # get the population per year (we take the population of the first crime type we find)
-    df_year["population"] = (
-        df_city[df_city["classe"] == "Coups et blessures volontaires"]
-        .groupby("annee")["POP"]
-        .sum()
-        .values
-    )
+    # the population is stored once per commune and year
+    df_population = star.commune_year.iloc[commune_rows(star.commune_year, [code_geo])]
+    df_year = df_year.merge(df_population[["annee", "POP"]], on="annee", how="left")
+    df_year = df_year.rename(columns={"POP": "population"})
+    df_year["annee"] = df_year["annee"].astype(int) + 2000
 
     # since the dataset doesn't provide the population for 2021 and 2022, we use the value from 2020
     df_year.loc[df_year["annee"] == 2021, "population"] = df_year.loc[
@@ -250,6 +347,55 @@ def get_crimes_per_year_by_city(city: str) -> pd.DataFrame:
 
 
 @st.cache_data
+@requires_columns("CODGEO_2023", "annee", "classe", "faits", "POP")
+def get_crimes_by_cities(cities: tuple[str, ...]) -> pd.DataFrame:
+    """
+    Returns the number of crimes per year and category for several cities at once.
+    The rows of all the cities are gathered in a single pass, so the cost grows
+    with the number of rows returned, not with the number of cities.
+
+    Parameters:
+    -----------
+    cities: tuple[str, ...]
+        The cities to compare, as "LIBGEO (DEP)".
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame with one row per city, year and category containing
+        the number of crimes, the population and the number of crimes per 1000 inhabitants.
+    """
+    star = load_star_schema()
+
+    df_communes = star.communes[star.communes["city_dep"].isin(cities)]
+    codes = df_communes["CODGEO"].tolist()
+
+    df_cities = star.facts.iloc[commune_rows(star.facts, codes)]
+    df_population = fill_missing_population(
+        star.commune_year.iloc[commune_rows(star.commune_year, codes)]
+    )
+
+    df_cities = df_cities.merge(
+        df_population[["CODGEO", "annee", "POP"]], on=["CODGEO", "annee"], how="left"
+    )
+    df_cities["CODGEO"] = df_cities["CODGEO"].astype(str)
+    df_cities = df_cities.merge(df_communes[["CODGEO", "city_dep"]], on="CODGEO")
+
+    df_cities["annee"] = df_cities["annee"].astype(int) + 2000
+    df_cities["classe"] = df_cities["classe"].astype(str)
+    df_cities = df_cities.rename(columns={"POP": "population"})
+    df_cities["faits_per_1000"] = (
+        df_cities["faits"] / df_cities["population"] * 1000
+    ).round(2)
+
+    return df_cities[
+        ["city_dep", "annee", "classe", "faits", "population", "faits_per_1000"]
+    ]
+
+
+@st.cache_data
+@persistent_cache
+@requires_columns("CODGEO_2023", "annee", "classe", "faits", "POP")
 def get_most_dangerous_cities(
     year: int, category: str, activated: bool
 ) -> pd.DataFrame:
@@ -270,13 +416,17 @@ def get_most_dangerous_cities(
     pd.DataFrame
         A pandas DataFrame containing the number of crimes per year by city.
     """
-    df = load_main_dataset()
-    df_comp = load_comp_dataset()
-
-    df_year = df[df["annee"] == year % 100]
-    df_category = df_year[df_year["classe"] == category]
+    star = load_star_schema()
+    df_facts = star.facts
+
+    df_category = df_facts[
+        (df_facts["annee"] == year % 100) & (df_facts["classe"] == category)
+    ]
+    df_category = df_category.merge(
+        star.commune_year, on=["CODGEO", "annee"], how="left"
+    )
 
-    df_category.loc[:, "faits_per_hab"] = df_category["faits"] / df_category["POP"]
+    df_category["faits_per_hab"] = df_category["faits"] / df_category["POP"]
 
     # Sort based on the 'activated' flag
     column_to_sort = "faits_per_hab" if activated else "faits"
@@ -284,11 +434,10 @@ def get_most_dangerous_cities(
         by=column_to_sort, ascending=False
     ).reset_index(drop=True)
 
-    cities = df_category.head(10)
-    cities = cities.rename(columns={"CODGEO_2023": "CODGEO"})
+    cities = df_category.head(10).astype({"CODGEO": str})
 
-    # Merge with the complementary dataset
-    cities = pd.merge(cities, df_comp, on="CODGEO")
+    # Merge with the commune attributes
+    cities = pd.merge(cities, star.communes, on="CODGEO")
 
     cities = cities[["LIBGEO", "faits", "faits_per_hab", "POP", "DEP"]]
     cities = cities.rename(columns={"faits_per_hab": "faits / hab"})
@@ -296,7 +445,580 @@ def get_most_dangerous_cities(
     return cities
 
 
+@st.cache_resource
+@persistent_cache
+@requires_columns("CODGEO_2023", "annee", "classe", "faits", "POP")
+def get_crime_cube() -> CrimeCube:
+    """
+    Returns the number of crimes as a dense commune x class x year matrix.
+    The arrays are shared by all the sessions without being copied: don't modify them.
+
+    Returns:
+    --------
+    CrimeCube
+        The number of crimes and the population of every commune.
+    """
+
+    return build_crime_cube(load_star_schema())
+
+
+# loosest guards of the anomaly scan, the lower bounds of the Anomalies page sliders
+ANOMALY_MIN_COUNT = 5
+ANOMALY_MIN_ZSCORE = 2.0
+
+
+@st.cache_data
+@persistent_cache
+def get_yoy_anomalies() -> pd.DataFrame:
+    """
+    Returns the communes with unusual year-over-year changes, for every class and year.
+    The scan is done once with the loosest guards of the Anomalies page
+    (ANOMALY_MIN_COUNT and ANOMALY_MIN_ZSCORE), its sliders then filter the rows.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame with one row per anomaly, with the city and its department,
+        sorted by decreasing absolute z-score.
+    """
+
+    df_anomalies = yoy_anomalies(
+        get_crime_cube(), ANOMALY_MIN_COUNT, ANOMALY_MIN_ZSCORE
+    )
+
+    df_communes = load_star_schema().communes[["CODGEO", "LIBGEO", "DEP"]]
+    df_anomalies = df_anomalies.merge(df_communes, on="CODGEO", how="left")
+
+    return df_anomalies[
+        [
+            "LIBGEO",
+            "DEP",
+            "classe",
+            "annee",
+            "faits_previous_year",
+            "faits",
+            "relative_change",
+            "zscore",
+        ]
+    ]
+
+
+@st.cache_resource
+@persistent_cache
+def get_percentile_index() -> PercentileIndex:
+    """
+    Returns the per-capita rates of all the communes sorted for each class and year,
+    nationally and per department, to rank a commune without sorting again.
+    The arrays are shared by all the sessions without being copied: don't modify them.
+
+    Returns:
+    --------
+    PercentileIndex
+        The sorted rates, see tools.analytics.percentile_ranks.
+    """
+
+    cube = get_crime_cube()
+    df_communes = load_star_schema().communes.drop_duplicates("CODGEO")
+    df_communes = df_communes.set_index("CODGEO")
+
+    departments = df_communes["DEP"].reindex(cube.codes).fillna("").astype(str)
+    return build_percentile_index(cube, departments.to_numpy())
+
+
+@st.cache_data
+def get_city_percentiles(city: str, year: int) -> pd.DataFrame:
+    """
+    Returns the percentile of a city's crimes per inhabitant for each category,
+    among all the cities of France and among the cities of its department.
+
+    Parameters:
+    -----------
+    city: str
+        The city, as "LIBGEO (DEP)".
+    year: int
+        The year to get the number of crimes from.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame with one row per category containing the number of crimes,
+        the number of crimes per 1000 inhabitants and the two percentiles.
+    """
+    cube = get_crime_cube()
+    index = get_percentile_index()
+
+    code = get_code_geo(city)
+    commune = np.searchsorted(cube.codes, code)
+    position = np.searchsorted(cube.years, year)
+    if (
+        commune == len(cube.codes)
+        or cube.codes[commune] != code
+        or position == len(cube.years)
+        or cube.years[position] != year
+    ):
+        return pd.DataFrame(
+            columns=[
+                "classe",
+                "faits",
+                "faits_per_1000",
+                "national_percentile",
+                "department_percentile",
+            ]
+        )
+
+    rates = per_capita_rates(cube, slice(commune, commune + 1))[0, :, position]
+    national, departmental = percentile_ranks(index, commune, rates, position)
+
+    return pd.DataFrame(
+        {
+            "classe": cube.classes,
+            "faits": cube.faits[commune, :, position],
+            "faits_per_1000": rates.round(2),
+            "national_percentile": national.round(1),
+            "department_percentile": departmental.round(1),
+        }
+    )
+
+
+@st.cache_resource
+def get_explorer_index() -> ExplorerIndex:
+    """
+    Returns the communal dataset with the city, population and department of each row,
+    sorted once on every sortable column.
+    The table is shared by all the sessions without being copied: don't modify it.
+
+    Returns:
+    --------
+    ExplorerIndex
+        The table and its sort orders, see tools.schema.explore.
+    """
+
+    return build_explorer_index(load_star_schema())
+
+
+@st.cache_data
+def get_explorer_page(
+    years: tuple[int, ...] = (),
+    classes: tuple[str, ...] = (),
+    departments: tuple[str, ...] = (),
+    min_population: float = 0,
+    max_population: float = np.inf,
+    sort_by: str = "CODGEO",
+    ascending: bool = True,
+    page: int = 0,
+    page_size: int = 50,
+) -> tuple[pd.DataFrame, int]:
+    """
+    Returns a page of the rows of the communal dataset matching some filters.
+    Only the rows of the page are sent to the browser.
+
+    Parameters:
+    -----------
+    years: tuple[int, ...]
+        The years of the rows, all the years when empty.
+    classes: tuple[str, ...]
+        The categories of crimes of the rows, all the categories when empty.
+    departments: tuple[str, ...]
+        The departments of the rows, all the departments when empty.
+    min_population: float
+        The minimum population of the city of the rows.
+    max_population: float
+        The maximum population of the city of the rows.
+    sort_by: str
+        The column to sort the rows on, see EXPLORER_SORT_COLUMNS.
+    ascending: bool
+        Whether to sort in ascending order.
+    page: int
+        The position of the page, from 0.
+    page_size: int
+        The number of rows per page.
+
+    Returns:
+    --------
+    tuple[pd.DataFrame, int]
+        The rows of the page and the number of rows matching the filters.
+    """
+    df_page, total = explore(
+        get_explorer_index(),
+        list(years),
+        list(classes),
+        list(departments),
+        min_population,
+        max_population,
+        sort_by,
+        ascending,
+        page,
+        page_size,
+    )
+
+    return df_page.reset_index(drop=True), total
+
+
+def export_explorer_rows(
+    years: tuple[int, ...] = (),
+    classes: tuple[str, ...] = (),
+    departments: tuple[str, ...] = (),
+    min_population: float = 0,
+    max_population: float = np.inf,
+) -> bytes:
+    """
+    Returns the rows of the communal dataset matching some filters as a gzipped CSV file.
+    The rows are written chunk by chunk to a temporary file, so only the compressed file
+    is kept in memory. The other formats, much larger, are left to `python -m tools.export`.
+
+    Parameters:
+    -----------
+    years: tuple[int, ...]
+        The years of the rows, all the years when empty.
+    classes: tuple[str, ...]
+        The categories of crimes of the rows, all the categories when empty.
+    departments: tuple[str, ...]
+        The departments of the rows, all the departments when empty.
+    min_population: float
+        The minimum population of the city of the rows.
+    max_population: float
+        The maximum population of the city of the rows.
+
+    Returns:
+    --------
+    bytes
+        The content of the gzipped file.
+    """
+
+    with tempfile.TemporaryFile() as f:
+        export_slice(
+            f,
+            get_explorer_index(),
+            years,
+            classes,
+            departments,
+            min_population,
+            max_population,
+            "csv.gz",
+        )
+        f.seek(0)
+        return f.read()
+
+
+@st.cache_resource
+@persistent_cache
+def get_trends() -> Trends:
+    """
+    Returns the linear trend of the number of crimes of every city and category.
+    The arrays are shared by all the sessions without being copied: don't modify them.
+
+    Returns:
+    --------
+    Trends
+        The slopes, confidence intervals and projections, see tools.analytics.fit_trends.
+    """
+
+    return fit_trends(get_crime_cube())
+
+
+@st.cache_data
+def get_city_trends(city: str) -> pd.DataFrame:
+    """
+    Returns the linear trend of the number of crimes of a city for each category.
+
+    Parameters:
+    -----------
+    city: str
+        The city, as "LIBGEO (DEP)".
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame with one row per category containing the slope in crimes per year,
+        its 95% confidence interval, the slope relative to the mean number of crimes
+        and the number of crimes projected for the next year.
+    """
+    cube = get_crime_cube()
+    trends = get_trends()
+
+    code = get_code_geo(city)
+    commune = np.searchsorted(cube.codes, code)
+    if commune == len(cube.codes) or cube.codes[commune] != code:
+        return pd.DataFrame(
+            columns=["classe", "slope", "ci_low", "ci_high", "relative_slope"]
+        )
+
+    slope = trends.slope[commune]
+    ci = trends.ci[commune]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        relative_slope = slope / trends.mean[commune] * 100
+
+    return pd.DataFrame(
+        {
+            "classe": cube.classes,
+            "slope": slope.round(2),
+            "ci_low": (slope - ci).round(2),
+            "ci_high": (slope + ci).round(2),
+            "relative_slope": relative_slope.round(2),
+            "projection": trends.projection[commune].round(),
+            "projection_year": cube.years[-1] + 1,
+            "years": trends.points[commune],
+        }
+    )
+
+
+@st.cache_resource
+def get_profile_index(year: int) -> ProfileIndex:
+    """
+    Returns the crime profile of every commune for a year, to find similar cities.
+    The arrays are shared by all the sessions without being copied: don't modify them.
+
+    Parameters:
+    -----------
+    year: int
+        The year of the profiles.
+
+    Returns:
+    --------
+    ProfileIndex
+        The profiles, see tools.analytics.nearest_profiles.
+    """
+
+    cube = get_crime_cube()
+    position = year_position(cube, year)
+    if position is None:
+        raise ValueError(f"{year} is not loaded, see CRIMESFRANCE_YEARS")
+    return build_profile_index(cube, position)
+
+
+@st.cache_data
+def get_similar_cities(
+    city: str,
+    year: int,
+    k: int = 10,
+    min_population: float = 0,
+    max_population: float = np.inf,
+) -> pd.DataFrame:
+    """
+    Returns the cities with the most similar crimes per inhabitant to a city.
+
+    Parameters:
+    -----------
+    city: str
+        The city, as "LIBGEO (DEP)".
+    year: int
+        The year to compare the cities on.
+    k: int
+        The number of cities to return.
+    min_population: float
+        The minimum population of the cities to return.
+    max_population: float
+        The maximum population of the cities to return.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame with the city itself then the similar cities, from the closest,
+        with their distance, population and crimes per 1000 inhabitants of each category.
+    """
+    cube = get_crime_cube()
+    position = year_position(cube, year)
+    if position is None:
+        return pd.DataFrame(columns=["city_dep", "distance", "population"])
+    index = get_profile_index(year)
+
+    code = get_code_geo(city)
+    commune = np.searchsorted(cube.codes, code)
+    if (
+        commune == len(cube.codes)
+        or cube.codes[commune] != code
+        or not index.valid[commune]
+    ):
+        return pd.DataFrame(columns=["city_dep", "distance", "population"])
+
+    nearest, distances = nearest_profiles(
+        index, commune, k, min_population, max_population
+    )
+    positions = np.concatenate([[commune], nearest]).astype(np.intp)
+
+    df_communes = load_star_schema().communes.drop_duplicates("CODGEO")
+    df_communes = df_communes.set_index("CODGEO")
+    rates = per_capita_rates(cube, positions)[:, :, position]
+
+    df_similar = pd.DataFrame(
+        {
+            "city_dep": df_communes["city_dep"]
+            .reindex(cube.codes[positions])
+            .to_numpy(),
+            "distance": np.concatenate([[0], distances]).round(3),
+            "population": index.population[positions],
+        }
+    )
+    df_rates = pd.DataFrame(rates.round(2), columns=cube.classes)
+    return pd.concat([df_similar, df_rates], axis=1)
+
+
+@st.cache_resource
+def get_zone_membership(level: str) -> ZoneMembership:
+    """
+    Returns the zone of every commune of the crime cube, for a level of zones.
+
+    Parameters:
+    -----------
+    level: str
+        The zone column of the complementary dataset, see ZONE_COLUMNS.
+
+    Returns:
+    --------
+    ZoneMembership
+        The zone codes and the position of the zone of each commune.
+    """
+
+    df_comp = load_comp_dataset()
+    return build_zone_membership(
+        get_crime_cube().codes, df_comp.set_index("CODGEO")[level]
+    )
+
+
+@st.cache_data
+@persistent_cache
+def get_crimes_by_zone(level: str) -> pd.DataFrame:
+    """
+    Returns the number of crimes and the population of each zone by year and category.
+    Each zone is named after its most populated city. The population only counts
+    the cities whose crimes of the category are published that year.
+
+    Parameters:
+    -----------
+    level: str
+        The zone column of the complementary dataset, see ZONE_COLUMNS.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame with one row per zone, year and category.
+    """
+    cube = get_crime_cube()
+    membership = get_zone_membership(level)
+    faits, population = zone_rollup(cube, membership)
+
+    # the most populated commune of each zone in the last year
+    known = np.flatnonzero(membership.zone_of >= 0)
+    order = known[
+        np.lexsort(
+            (-np.nan_to_num(cube.population[known, -1]), membership.zone_of[known])
+        )
+    ]
+    first = np.unique(membership.zone_of[order], return_index=True)[1]
+
+    df_comp = load_comp_dataset().drop_duplicates("CODGEO").set_index("CODGEO")
+    largest = df_comp["city_dep"].reindex(cube.codes[order[first]]).to_numpy()
+    labels = pd.Series(membership.zones).str.cat(largest, sep=" - ", na_rep="?")
+    communes = np.bincount(membership.zone_of[known], minlength=len(membership.zones))
+
+    zones, classes, years = np.indices(faits.shape).reshape(3, -1)
+    df_zones = pd.DataFrame(
+        {
+            "zone": membership.zones[zones],
+            "label": labels.to_numpy()[zones],
+            "communes": communes[zones],
+            "annee": cube.years[years],
+            "classe": cube.classes[classes],
+            "faits": faits.ravel(),
+            "population": population.ravel(),
+        }
+    )
+    df_zones["faits_per_1000"] = (
+        df_zones["faits"]
+        / df_zones["population"].where(df_zones["population"] > 0)
+        * 1000
+    ).round(2)
+    return df_zones
+
+
+@st.cache_resource
+def get_department_index() -> DepartmentIndex:
+    """
+    Returns the communes of the crime cube grouped by department.
+    The arrays are shared by all the sessions without being copied: don't modify them.
+
+    Returns:
+    --------
+    DepartmentIndex
+        The communes of each department, see tools.analytics.department_communes.
+    """
+
+    cube = get_crime_cube()
+    df_communes = load_star_schema().communes
+    df_communes = df_communes[~df_communes["CODGEO"].duplicated()].set_index("CODGEO")
+
+    departments = df_communes["DEP"].reindex(cube.codes).fillna("").astype(str)
+    labels = df_communes["LIBGEO"].reindex(cube.codes).fillna("").astype(str)
+    return build_department_index(departments.to_numpy(), labels.to_numpy())
+
+
+@st.cache_data
+def get_department_communes(
+    department: str, year: int, category: str | None = None
+) -> pd.DataFrame:
+    """
+    Returns the number of crimes of the communes of a department for a year,
+    sorted by number of crimes.
+
+    Parameters:
+    -----------
+    department: str
+        The department, as in the DEP column of the complementary dataset, e.g. "13".
+    year: int
+        The year, e.g. 2022.
+    category: str | None
+        The category of crimes, all the categories when None.
+
+    Returns:
+    --------
+    pd.DataFrame
+        A pandas DataFrame with one row per commune (CODGEO, LIBGEO, faits, population,
+        faits_per_1000), empty for an unknown department or a year that isn't loaded.
+    """
+
+    cube = get_crime_cube()
+    position = year_position(cube, year)
+    if position is None:
+        return pd.DataFrame(
+            {
+                "CODGEO": pd.Series(dtype=object),
+                "LIBGEO": pd.Series(dtype=object),
+                "faits": pd.Series(dtype=np.float64),
+                "population": pd.Series(dtype=cube.population.dtype),
+                "faits_per_1000": pd.Series(dtype=np.float64),
+            }
+        )
+    index = get_department_index()
+
+    rows = department_communes(index, department)
+    communes = index.communes[rows]
+
+    faits = cube.faits[communes, :, position]
+    if category is not None:
+        faits = faits[:, cube.classes == category].reshape(len(communes), -1)
+    # a commune without any published category has no number of crimes
+    faits = np.where(np.isnan(faits).all(axis=1), np.nan, np.nansum(faits, axis=1))
+
+    df_department = pd.DataFrame(
+        {
+            "CODGEO": cube.codes[communes],
+            "LIBGEO": index.labels[rows],
+            "faits": faits,
+            "population": cube.population[communes, position],
+        }
+    )
+    df_department["faits_per_1000"] = (
+        df_department["faits"]
+        / df_department["population"].where(df_department["population"] > 0)
+        * 1000
+    ).round(2)
+    return df_department.sort_values(
+        "faits", ascending=False, ignore_index=True, na_position="last"
+    )
+
+
 @st.cache_data
+@persistent_cache
 def get_df_dep_lat_lon(df: pd.DataFrame, year: int) -> pd.DataFrame:
     """
     Returns a DataFrame containing the number of crimes per department for a given year.
@@ -384,6 +1106,11 @@ def set_page(page: str) -> None:
         "City": "🏙️",
         "Cities & Categories": "🚨",
         "Map": "🗺️",
+        "Compare": "⚖️",
+        "Anomalies": "🔎",
+        "Zones": "🧩",
+        "Similar Cities": "🔗",
+        "Explorer": "📋",
         "Documentation": "📖",
         "About": "👨‍💻",
     }